@@ -1,12 +1,14 @@
-import requests, pytz, sys, os, json, traceback, time, concurrent.futures, threading
+import sys, json, traceback, time, threading
+import client, metrics, logger, breaker, screen, configfile, profiler
 _print = print
 from rich import print
 from datetime import datetime, timedelta
-from tzlocal import get_localzone
-from utils import (getch, fint, inp, current_time, time_taken, get_headers, get_duo_info, clear,
-                   fetch_username_and_id, farm_progress, warn_request_count, ratelimited_warning, login_password)
+from utils import (getch, fint, inp, current_time, time_taken, get_headers, get_duo_info, invalidate_duo_info,
+                   clear, fetch_username_and_id, farm_progress, warn_request_count, ratelimited_warning, login_password,
+                   task_keys, farm_stats, TASK_KEYS_HINT, local_timezone)
 import version
-import updater
+from journal import TaskJournal, JOURNAL_FILE
+# updater, saver, requests, pytz and concurrent.futures are imported where they're used, to keep startup fast
 
 # TODO: Port some functions from [my private project] to here
 # TODO: Add questsaver function to the saver script
@@ -17,47 +19,55 @@ import updater
 # TODO: Add Verbose Mode in addition to Debug Mode
 # TODO: Fix DuoKLI crashing when trying to farm on the newly added account right after adding it
 # TODO: Implement "Check for updates" setting that will check the GitHub repo for updates, automatically update DuoKLI if an update is found
-# TODO: Write debug info into a log file
 # TODO: Add mouse support
 # TODO: Create a simple logging class to decrease clutter in the code by debug prints and such
 
 VERSION = version.__version__
-TIMEZONE = str(get_localzone())
 
-with open("config.json", "r") as f:
-    config: dict = json.load(f)
+config: dict = configfile.load()
 
 AUTOUPDATE = config.get('autoupdate', False)
 ASK_AUTOUPDATE = config.get('ask_autoupdate', True)
 DEBUG = config['debug']
+logger.configure(config)
+breaker.configure(config)
+profiler.configure(config)
+client.set_debug(DEBUG)
+def offer_update():
+    # Shows the update the background check staged (if any) before a menu is drawn
+    if AUTOUPDATE and "updater" in sys.modules:
+        try:
+            if sys.modules["updater"].offer_staged_update(ask=ASK_AUTOUPDATE, cfg=config):
+                screen.invalidate()
+        except Exception as e:
+            if DEBUG:
+                print(
+                    f"{current_time()} [bold magenta][DEBUG][/] An error occurred while trying to auto-update DuoKLI: {e}\n"
+                    f"{traceback.format_exc()}"
+                )
+
+_journal = None
+
+def get_journal() -> TaskJournal:
+    global _journal
+    if _journal is None:
+        _journal = TaskJournal(config.get('task_journal_file', JOURNAL_FILE))
+    return _journal
+
 def title_string() -> str:
     return f'\n   [bold][bright_green]Duo[/][bright_blue]KLI[/] [white]{VERSION}[/]{" [magenta][Debug Mode Enabled][/]" if DEBUG else ""}[/]'
 
-def start_task(type: str, account: int, request_amount: bool = True) -> bool:
-    if request_amount:
+def start_task(type: str, account: int, request_amount: bool = True, resume: dict | None = None) -> bool:
+    # `resume` is an unfinished task from the journal, continued from its last checkpoint
+    if resume:
+        amount = resume['target']
+    elif request_amount:
         try:
             amount = int(inp(f" Enter amount of {type}", ["0 to farm endlessly"]))
         except ValueError:
             return False
 
-    if type.lower() in ['gems', 'fast gems']:
-        # Due to how the fast gems function works,
-        #   the length of the `futures` list is equal to `amount` divided by 30.
-        # Therefore, entering a huge number will result in the list becoming so big,
-        #   that the system will most likely run out of RAM,
-        #   crashing DuoKLI and possibly other running programs.
-        # We don't want to risk that happening, so we add a hard-coded limit to prevent it.
-        #
-        # FYI, 5 million fast gems -> ~400 MB of RAM used by the `futures` list
-        if amount >= 5_000_000 and type.lower() == 'fast gems':
-            print(
-                "\n [bright_red]Amount of fast gems is too high!"
-                "\n Please enter a number under 5,000,000 or enter 0 to farm endlessly.[/]"
-            )
-            print("\n [bright_yellow]Press any key to continue.[/]")
-            getch()
-            return False
-
+    if type.lower() in ['gems', 'fast gems'] and not resume:
         if amount == 0:
             if not warn_request_count(0):
                 return False
@@ -70,20 +80,34 @@ def start_task(type: str, account: int, request_amount: bool = True) -> bool:
     if type == "Super Duolingo":
         print(" [bright_yellow]Activating 3 days of Super Duolingo...[/]", end="")
     else:
-        print("\n  [bright_yellow]Press Ctrl+C to stop farming.[/]\n")
-        print(f" [blue]Starting to farm {fint(amount)} {type}...[/]", end="")
+        print(f"\n  [bright_yellow]{TASK_KEYS_HINT}[/]\n")
+        if resume:
+            print(f" [blue]Resuming farming {fint(amount)} {type} ({resume['done']:,} done)...[/]", end="")
+        else:
+            print(f" [blue]Starting to farm {fint(amount)} {type}...[/]", end="")
     _print("\r", end="")
 
-    if type.lower() == "xp":
-        farm = xp_farm(amount, account)
-    elif type.lower() == "gems":
-        farm = gem_farm(amount, account)
-    elif type.lower() == "fast gems":
-        farm = fast_gem_farm(amount, account)
-    elif type.lower() == "streak days":
-        farm = streak_farm(amount, account)
-    elif type.lower() == "super duolingo":
-        farm = activate_super(account)
+    metrics.registry.reset()
+    profile_summary = []
+    try:
+        with profiler.session(type, config, profile_summary):
+            if type.lower() == "xp":
+                farm = xp_farm(amount, account, resume)
+            elif type.lower() == "gems":
+                farm = gem_farm(amount, account, resume)
+            elif type.lower() == "fast gems":
+                farm = fast_gem_farm(amount, account)
+            elif type.lower() == "streak days":
+                farm = streak_farm(amount, account, resume)
+            elif type.lower() == "super duolingo":
+                farm = activate_super(account)
+    except breaker.CircuitOpen:
+        # Still rate limited from an earlier task; nothing was sent
+        ratelimited_warning()
+        farm = None
+    finally:
+        # A stopped task resumes from its last count, even if that checkpoint was held back
+        get_journal().flush()
 
     if farm and type.lower() in ["xp", "gems", "fast gems", "streak days"]:
         print(
@@ -91,12 +115,34 @@ def start_task(type: str, account: int, request_amount: bool = True) -> bool:
             f" [blue]🕒 Time Taken: {time_taken(farm['end'] - farm['start'])}[/]"
         )
 
+    print_metrics()
+    if profile_summary:
+        from rich.markup import escape
+        print("\n [bold magenta]Profile:[/]")
+        for line in profile_summary:
+            print(f" [magenta]{escape(line)}[/]")
+
     _print("\033[?25l", end="")
     print("\n [bright_yellow]Press any key to continue.[/]")
     getch()
+    # Task output may have scrolled the screen, so the next menu is drawn from scratch
+    screen.invalidate()
     return True
 
-def xp_farm(amount, account):
+def print_metrics():
+    if DEBUG:
+        print(f"\n{current_time()} [bold magenta][DEBUG][/] Requests:")
+        for line in metrics.registry.summary():
+            print(f"{current_time()} [bold magenta][DEBUG][/]   {line}")
+        print(f"{current_time()} [bold magenta][DEBUG][/] Request log: {logger.log_path()}")
+    if config.get('metrics_file'):
+        try:
+            metrics.registry.write_snapshot(config['metrics_file'])
+        except OSError as e:
+            print(f" [red]Failed to write metrics to {config['metrics_file']}: {e}[/]")
+
+def xp_farm(amount, account, resume: dict | None = None):
+    import pytz
     if amount < 0:
         print(" [red]Cannot farm negative XP![/]")
         return
@@ -104,15 +150,25 @@ def xp_farm(amount, account):
     url = f'https://stories.duolingo.com/api2/stories/fr-en-le-passeport/complete'
     headers = get_headers(account)
 
-    total_xp = 0
-    xp_left = amount if amount else sys.maxsize
+    journal = get_journal()
+    if resume:
+        task_id, total_xp = resume['task'], resume['done']
+    else:
+        task_id, total_xp = journal.start("XP", config['accounts'][account]['id'], amount), 0
+    resumed_xp = total_xp
+    xp_left = amount - total_xp if amount else sys.maxsize
+    failed = False
+    laps = profiler.Laps()
 
     with farm_progress("XP", "yellow", amount == 0) as prog:
-        task = prog.add_task("", total=amount if amount else None)
+        task = prog.add_task("", total=amount if amount else None, completed=total_xp)
         start = time.monotonic()
         while True:
             try:
-                cur_time = datetime.now(pytz.timezone(TIMEZONE))
+                if not task_keys(prog, lambda: farm_stats(total_xp - resumed_xp, "XP", start)):
+                    break
+                laps.skip()
+                cur_time = datetime.now(pytz.timezone(local_timezone()))
                 dataget = {
                     "awardXp": True,
                     "completedBonusChallenge": True,
@@ -129,75 +185,99 @@ def xp_farm(amount, account):
                     "score": 0,
                     "happyHourBonusXp": 469 if xp_left >= 499 else xp_left - 30,
                     "startTime": cur_time.timestamp(),
-                    "endTime": datetime.now(pytz.timezone(TIMEZONE)).timestamp(),
+                    "endTime": datetime.now(pytz.timezone(local_timezone())).timestamp(),
                 }
+                laps.mark("payload")
 
-                response = requests.post(url, headers=headers, json=dataget, timeout=10)
+                response = client.post(url, headers=headers, json=dataget, retry=failed)
+                failed = response.status_code != 200
+                laps.skip()
 
                 if response.status_code == 200:
                     result = response.json()
+                    laps.mark("parse")
                     total_xp += result.get('awardedXp', 0)
                     prog.update(task, completed=total_xp)
                     xp_left -= result.get('awardedXp', 0)
+                    laps.mark("progress")
+                    journal.checkpoint(task_id, total_xp)
+                    laps.mark("journal")
                 else:
                     print(f" [red]Failed to farm {499 if xp_left >= 499 else xp_left} XP ({total_xp:,}/{fint(amount)} XP)[/]")
-                if DEBUG:
-                    print(
-                        f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-                        f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}\n"
-                    )
                 if xp_left <= 0:
+                    journal.finish(task_id, total_xp)
                     break
+            except breaker.CircuitOpen:
+                ratelimited_warning()
+                break
             except KeyboardInterrupt:
                 break
             except Exception as e:
                 print(f" [bold red]An error occurred ({total_xp:,}/{fint(amount)} XP): {e}[/]")
 
+    invalidate_duo_info(account)
     end = time.monotonic()
     return {'total': total_xp, 'start': start, 'end': end}
 
-def gem_farm(amount, account):
+def gem_farm(amount, account, resume: dict | None = None):
     if amount < 0:
         print(" [red]Cannot farm negative gems![/]")
         return
 
     headers = get_headers(account)
-    duo_info = get_duo_info(account, DEBUG)
-    fromLanguage = duo_info.get('fromLanguage', 'Unknown')
-    learningLanguage = duo_info.get('learningLanguage', 'Unknown')
+    journal = get_journal()
+    if resume:
+        fromLanguage, learningLanguage = resume['state']['from_language'], resume['state']['learning_language']
+        task_id, total_gems = resume['task'], resume['done']
+    else:
+        duo_info = get_duo_info(account, ("from_language", "learning_language"), DEBUG)
+        fromLanguage = duo_info.from_language or 'Unknown'
+        learningLanguage = duo_info.learning_language or 'Unknown'
+        task_id = journal.start("gems", config['accounts'][account]['id'], amount, from_language=fromLanguage, learning_language=learningLanguage)
+        total_gems = 0
+    resumed_gems = total_gems
 
     per_request = 30
     requests_needed = (amount + per_request - 1) // per_request
     expected_total = requests_needed * per_request
-    total_gems = 0
-    gems_left = expected_total if amount else sys.maxsize
+    gems_left = expected_total - total_gems if amount else sys.maxsize
+    failed = False
+    laps = profiler.Laps()
 
     with farm_progress("gems", "cyan", amount == 0) as prog:
-        task = prog.add_task("", total=expected_total if amount else None)
+        task = prog.add_task("", total=expected_total if amount else None, completed=total_gems)
         start = time.monotonic()
         while True:
             try:
+                if not task_keys(prog, lambda: farm_stats(total_gems - resumed_gems, "gems", start)):
+                    break
+                laps.skip()
                 url = f"https://www.duolingo.com/2017-06-30/users/{config['accounts'][account]['id']}/rewards/SKILL_COMPLETION_BALANCED-…-2-GEMS"
                 payload = {"consumed": True, "fromLanguage": fromLanguage, "learningLanguage": learningLanguage}
+                laps.mark("payload")
 
-                response = requests.patch(url, headers=headers, json=payload, timeout=10)
+                response = client.patch(url, headers=headers, json=payload, retry=failed)
+                failed = response.status_code != 200
+                laps.skip()
 
                 if response.status_code == 200:
                     total_gems += per_request
                     prog.update(task, completed=total_gems)
                     gems_left -= per_request
+                    laps.mark("progress")
+                    journal.checkpoint(task_id, total_gems)
+                    laps.mark("journal")
                 elif response.status_code == 403:
                     ratelimited_warning()
                     return
                 else:
                     print(f" [red]Failed to farm {per_request} gems ({total_gems:,}/{fint(expected_total)} gems)[/]")
-                if DEBUG:
-                    print(
-                        f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-                        f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}\n"
-                    )
                 if gems_left <= 0:
+                    journal.finish(task_id, total_gems)
                     break
+            except breaker.CircuitOpen:
+                ratelimited_warning()
+                break
             except KeyboardInterrupt:
                 break
             except Exception as e:
@@ -207,14 +287,15 @@ def gem_farm(amount, account):
     return {'total': total_gems, 'start': start, 'end': end}
 
 def fast_gem_farm(amount, account):
+    import concurrent.futures
     if amount < 0:
         print(" [red]Cannot farm negative gems![/]")
         return
 
     headers = get_headers(account)
-    duo_info = get_duo_info(account, DEBUG)
-    fromLanguage = duo_info.get('fromLanguage', 'Unknown')
-    learningLanguage = duo_info.get('learningLanguage', 'Unknown')
+    duo_info = get_duo_info(account, ("from_language", "learning_language"), DEBUG)
+    fromLanguage = duo_info.from_language or 'Unknown'
+    learningLanguage = duo_info.learning_language or 'Unknown'
 
     per_request = 30
     requests_needed = (amount + per_request - 1) // per_request
@@ -233,20 +314,33 @@ def fast_gem_farm(amount, account):
             if stop_event.is_set():
                 return None, "stopped"
             try:
-                resp = requests.patch(url, headers=headers, json=payload, timeout=10)
+                resp = client.patch(url, headers=headers, json=payload)
                 return resp.status_code, getattr(resp, 'text', '')
+            except breaker.CircuitOpen:
+                # Another worker hit the rate limit; queued requests are dropped without being sent
+                stop_event.set()
+                return None, "rate limited"
             except Exception as ex:
                 return None, str(ex)
 
         max_workers = min(20, requests_needed) if requests_needed > 0 else 1 if amount else 20
         executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-        futures = []
+        # Only keep a small window of requests queued ahead of the workers,
+        #   so memory use stays the same no matter how many gems are requested.
+        window = max_workers * 2
+        in_flight = set()
+        submitted = 0
         try:
             while not stop_event.is_set():
-                futures = [executor.submit(do_patch) for _ in range(requests_needed if amount else 1000)]
-                for fut in concurrent.futures.as_completed(futures):
-                    if stop_event.is_set():
-                        break
+                if not task_keys(prog, lambda: farm_stats(total_gems, "gems", start)):
+                    break
+                while len(in_flight) < window and (not amount or submitted < requests_needed):
+                    in_flight.add(executor.submit(do_patch))
+                    submitted += 1
+                if not in_flight:
+                    break
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
                     try:
                         status, content = fut.result()
                     except Exception as e:
@@ -254,70 +348,84 @@ def fast_gem_farm(amount, account):
                     if status == 200:
                         total_gems += per_request
                         prog.update(task, completed=total_gems)
-                    elif status == 403:
-                        ratelimited_warning()
+                    elif status in client.RATE_LIMITED or content == "rate limited":
                         stop_event.set()
+                        ratelimited_warning()
                         return
-                    else:
+                    elif status is not None or content != "stopped":
                         print(f" [red]Failed to farm {per_request} gems ({total_gems:,}/{fint(expected_total)} gems)[/]")
-                    if DEBUG:
-                        print(
-                            f"{current_time()} [bold magenta][DEBUG][/] Status code {status}\n"
-                            f"{current_time()} [bold magenta][DEBUG][/] Content: {content}\n"
-                        )
-                if amount:
-                    break
         except KeyboardInterrupt:
             stop_event.set()
-            for fut in futures:
-                fut.cancel()
         except Exception as e:
             print(f" [bold red]An error occurred ({total_gems:,}/{fint(expected_total)} gems): {e}[/]")
         finally:
+            stop_event.set()
             try:
-                executor.shutdown(wait=False)
+                executor.shutdown(wait=False, cancel_futures=True)
             except Exception:
                 pass
 
     end = time.monotonic()
     return {'total': total_gems, 'start': start, 'end': end}
 
-def streak_farm(amount, account):
-    duo_info = get_duo_info(account, DEBUG)
+def streak_farm(amount, account, resume: dict | None = None):
+    import pytz
     headers = get_headers(account)
-    fromLanguage = duo_info.get('fromLanguage', 'Unknown')
-    learningLanguage = duo_info.get('learningLanguage', 'Unknown')
+    journal = get_journal()
+    is_finishing = False
+    failed = False
+
+    if resume:
+        # Continues from the last simulated day, with the streak start date the task began with
+        state = resume['state']
+        fromLanguage, learningLanguage = state['from_language'], state['learning_language']
+        streak_start_date = datetime.fromisoformat(state['streak_start'])
+        task_id, day_count = resume['task'], resume['done']
+    else:
+        duo_info = get_duo_info(account, ("from_language", "learning_language", "streak_data"), DEBUG)
+        fromLanguage = duo_info.from_language or 'Unknown'
+        learningLanguage = duo_info.learning_language or 'Unknown'
 
-    streak_data = duo_info.get('streakData', {})
-    current_streak = streak_data.get('currentStreak', {})
+        streak_data = duo_info.streak_data or {}
+        current_streak = streak_data.get('currentStreak', {})
 
-    user_tz = pytz.timezone(TIMEZONE)
-    now = datetime.now(user_tz)
-    day_count = 0
-    is_finishing = False
+        user_tz = pytz.timezone(local_timezone())
+        now = datetime.now(user_tz)
+        day_count = 0
 
-    if not current_streak:
-        streak_start_date = now
-    else:
-        streak_start_date = datetime.strptime(current_streak.get('startDate'), "%Y-%m-%d")
-        if streak_start_date <= datetime(1, 1, 2, 0, 0):
-            print(" [yellow]You have already reached the maximum amount of streak days possible![/]")
-            return
+        if not current_streak:
+            streak_start_date = now
+        else:
+            streak_start_date = datetime.strptime(current_streak.get('startDate'), "%Y-%m-%d")
+            if streak_start_date <= datetime(1, 1, 2, 0, 0):
+                print(" [yellow]You have already reached the maximum amount of streak days possible![/]")
+                return
+        task_id = journal.start("streak days", config['accounts'][account]['id'], amount, from_language=fromLanguage,
+                                learning_language=learningLanguage, streak_start=streak_start_date.isoformat())
+    resumed_days = day_count
+    laps = profiler.Laps()
 
     with farm_progress("streak days", "sandy_brown", amount == 0) as prog:
-        task = prog.add_task("", total=amount if amount else None)
+        task = prog.add_task("", total=amount if amount else None, completed=min(day_count, amount) if amount else day_count)
         amount = amount if amount else sys.maxsize
         start = time.monotonic()
         while True:
             try:
+                if not task_keys(prog, lambda: farm_stats(day_count - resumed_days, "streak days", start)):
+                    break
+                laps.skip()
                 try:
                     simulated_day = streak_start_date - timedelta(days=day_count)
                     if simulated_day <= datetime(1, 1, 2, 0, 0):
                         print(" [green]Reached the maximum amount of streak days possible![/]")
+                        journal.finish(task_id, day_count)
+                        invalidate_duo_info(account)
                         end = time.monotonic()
                         return {'total': day_count, 'start': start, 'end': end}
                 except:
                     print(" [green]Reached the maximum amount of streak days possible![/]")
+                    journal.finish(task_id, day_count)
+                    invalidate_duo_info(account)
                     end = time.monotonic()
                     return {'total': day_count, 'start': start, 'end': end}
 
@@ -354,27 +462,24 @@ def streak_farm(amount, account):
                     "type": "GLOBAL_PRACTICE"
                 }
 
-                response = requests.post("https://www.duolingo.com/2017-06-30/sessions", headers=headers, json=session_payload, timeout=10)
+                laps.mark("payload")
+                response = client.post("https://www.duolingo.com/2017-06-30/sessions", headers=headers, json=session_payload, retry=failed)
+                failed = response.status_code != 200
+                laps.skip()
 
                 if response.status_code == 200:
                     session_data = response.json()
+                    laps.mark("parse")
                     if DEBUG:
-                        print(f"{current_time()} [bold magenta][DEBUG][/] Session created")
+                        logger.debug("Session created")
                 else:
                     print(f" [red]Failed to create a session ({day_count:,}/{fint(amount)} days)[/]")
-                    if DEBUG:
-                        print(
-                            f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-                            f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                        )
                     continue
                 if 'id' not in session_data:
                     print(f" [red]Session ID not found in response data ({day_count:,}/{fint(amount)} days)[/]")
                     if DEBUG:
-                        print(
-                            f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-                            f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                        )
+                        logger.debug("Session ID not found in response: %s", logger.Body(response))
+                    failed = True
                     continue
 
                 try:
@@ -382,6 +487,8 @@ def streak_farm(amount, account):
                     end_timestamp = int(simulated_day.timestamp())
                 except ValueError:
                     print(" [green]Reached the maximum amount of streak days possible![/]")
+                    journal.finish(task_id, day_count)
+                    invalidate_duo_info(account)
                     end = time.monotonic()
                     return {'total': day_count, 'start': start, 'end': end}
 
@@ -395,30 +502,35 @@ def streak_farm(amount, account):
                     "maxInLessonStreak": 9,
                     "shouldLearnThings": True
                 }
+                laps.mark("payload")
 
-                response = requests.put(f"https://www.duolingo.com/2017-06-30/sessions/{session_data['id']}", headers=headers, json=update_payload, timeout=10)
+                response = client.put(f"https://www.duolingo.com/2017-06-30/sessions/{session_data['id']}", headers=headers, json=update_payload)
+                failed = response.status_code != 200
+                laps.skip()
 
                 if response.status_code == 200:
                     day_count += 1
                     prog.update(task, completed=day_count) if not is_finishing else None
+                    laps.mark("progress")
+                    journal.checkpoint(task_id, day_count)
+                    laps.mark("journal")
                     if DEBUG:
-                        print(f"{current_time()} [bold magenta][DEBUG][/] Session updated")
+                        logger.debug("Session updated")
                 else:
                     print(f" [red]Failed to extend streak ({day_count:,}/{fint(amount)} days)[/]")
-                if DEBUG:
-                    msg = f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}"
-                    if response.status_code != 200:
-                        msg += f"\n{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                    print(msg)
-
 
                 if day_count > amount:
+                    journal.finish(task_id, day_count)
                     break
+            except breaker.CircuitOpen:
+                ratelimited_warning()
+                break
             except KeyboardInterrupt:
                 break
             except Exception as e:
                 print(f" [bold red]An error occurred ({day_count:,}/{fint(amount)} days): {e}[/]")
 
+    invalidate_duo_info(account)
     end = time.monotonic()
     return {'total': day_count-1, 'start': start, 'end': end}
 
@@ -427,11 +539,11 @@ def activate_super(account):
     headers = get_headers(account)
     json_data = {"itemName":"immersive_subscription","productId":"com.duolingo.immersive_free_trial_subscription"}
 
-    response = requests.post(url, headers=headers, json=json_data, timeout=10)
+    response = client.post(url, headers=headers, json=json_data)
 
     try:
         res_json = response.json()
-    except requests.exceptions.JSONDecodeError:
+    except ValueError:
         print(" [red]Failed to activate 3 days of Duolingo Super.[/]")
         if response.status_code == 200:
             print(
@@ -440,143 +552,197 @@ def activate_super(account):
             )
         elif response.status_code == 400:
             print(" [red]You're most likely banned from getting Duolingo Super trials.[/]")
-        if DEBUG:
-            print(
-                f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-                f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-            )
         return
 
     if response.status_code == 200 and "purchaseId" in res_json:
+        invalidate_duo_info(account)
         print(" [green]Successfully activated 3 days of Duolingo Super![/]")
         print(" [blue]Note that you most likely didn't actually get Duolingo Super,\n due to Duolingo's new detection system.[/]")
     else:
         print(" [red]Failed to activate 3 days of Duolingo Super.[/]")
-    if DEBUG:
-        print(
-            f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-            f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-        )
 
-def give_item(account, item):
-    item_id = item[0]
-    item_name = item[1]
+def give_items(account, items: list[tuple[str, str, str]]):
+    # Claims every selected item in one /batch request; the batch answers with one response per sub-request,
+    #   in order, so each item's result is decoded and reported on its own
+    user_id = config['accounts'][account]['id']
     headers = get_headers(account)
-    duo_info = get_duo_info(account, DEBUG)
-    fromLanguage = duo_info.get('fromLanguage', 'Unknown')
-    learningLanguage = duo_info.get('learningLanguage', 'Unknown')
-
-    if item_id == "xp_boost_refill":
-        inner_body = {
-            "isFree": False,
-            "learningLanguage": learningLanguage,
-            "subscriptionFeatureGroupId": 0,
-            "xpBoostSource": "REFILL",
-            "xpBoostMinutes": 15,
-            "xpBoostMultiplier": 3,
-            "id": item_id
-        }
-        payload = {
-            "includeHeaders": True,
-            "requests": [
-                {
-                    "url": f"/2023-05-23/users/{config['accounts'][account]['id']}/shop-items",
-                    "extraHeaders": {},
-                    "method": "POST",
-                    "body": json.dumps(inner_body)
-                }
-            ]
-        }
-        url = "https://ios-api-2.duolingo.com/2023-05-23/batch"
-        headers["host"] = "ios-api-2.duolingo.com"
-        headers["x-amzn-trace-id"] = f"User={config['accounts'][account]['id']}"
-        data = payload
-    else:
-        data = {
-            "itemName": item_id,
-            "isFree": True,
-            "consumed": True,
-            "fromLanguage": fromLanguage,
-            "learningLanguage": learningLanguage
-        }
-        url = f"https://www.duolingo.com/2017-06-30/users/{config['accounts'][account]['id']}/shop-items"
-
-    response = requests.post(url, headers=headers, json=data, timeout=10)
+    try:
+        duo_info = get_duo_info(account, ("from_language", "learning_language"), DEBUG)
+    except breaker.CircuitOpen:
+        ratelimited_warning()
+        return
+    if duo_info is None:
+        print(" [red]Failed to retrieve your Duolingo profile, no items were claimed.[/]")
+        return
+    fromLanguage = duo_info.from_language or 'Unknown'
+    learningLanguage = duo_info.learning_language or 'Unknown'
+
+    # Each sub-request keeps the path and body its item was claimed with on its own: the XP boost refill through
+    #   the 2023-05-23 shop-items endpoint, every other item through the 2017-06-30 one
+    sub_requests = []
+    for item_id, _, _ in items:
+        if item_id == "xp_boost_refill":
+            path = f"/2023-05-23/users/{user_id}/shop-items"
+            body = {
+                "isFree": False,
+                "learningLanguage": learningLanguage,
+                "subscriptionFeatureGroupId": 0,
+                "xpBoostSource": "REFILL",
+                "xpBoostMinutes": 15,
+                "xpBoostMultiplier": 3,
+                "id": item_id
+            }
+        else:
+            path = f"/2017-06-30/users/{user_id}/shop-items"
+            body = {
+                "itemName": item_id,
+                "isFree": True,
+                "consumed": True,
+                "fromLanguage": fromLanguage,
+                "learningLanguage": learningLanguage
+            }
+        sub_requests.append({
+            "url": path,
+            "extraHeaders": {},
+            "method": "POST",
+            "body": json.dumps(body)
+        })
+    url = "https://ios-api-2.duolingo.com/2023-05-23/batch"
+    headers["host"] = "ios-api-2.duolingo.com"
+    headers["x-amzn-trace-id"] = f"User={user_id}"
+
+    try:
+        response = client.post(url, headers=headers, json={"includeHeaders": True, "requests": sub_requests})
+    except breaker.CircuitOpen:
+        ratelimited_warning()
+        return
+    results = []
     if response.status_code == 200:
-        print(f" [green]Successfully received item \"{item_name}\"![/]")
-    else:
-        print(f" [red]Failed to receive item \"{item_name}\".[/]")
-    if DEBUG:
-        print(
-            f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-            f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-        )
+        try:
+            results = response.json().get("responses", [])
+        except ValueError:
+            pass
+    if DEBUG and response.status_code != 200:
+        print(f"{current_time()} [bold magenta][DEBUG][/] Batch request failed with status code {response.status_code}")
+
+    claimed = 0
+    for i, (_, item_name, _) in enumerate(items):
+        # A missing sub-response (e.g. the whole batch failed) counts as a failure
+        result = results[i] if i < len(results) else {}
+        if result.get("status") == 200:
+            claimed += 1
+            print(f" [green]Successfully received item \"{item_name}\"![/]")
+        else:
+            print(f" [red]Failed to receive item \"{item_name}\".[/]")
+            if DEBUG and result:
+                print(f"{current_time()} [bold magenta][DEBUG][/] Status code {result.get('status')}: {result.get('body')}")
+    if claimed:
+        invalidate_duo_info(account)
 
 # MARK: Program starts here
 # Program starts here ------------------------------------------------------------------------------------------------
 
-try:
-    _print("\033[?25l")
-    if AUTOUPDATE:
-        try:
-            updater.check_and_stage_update(apply=True, printing=False, ask=ASK_AUTOUPDATE, config=config, debug=DEBUG, autoupdating=True)
-        except Exception as e:
-            if DEBUG:
-                print(
-                    f"{current_time()} [bold magenta][DEBUG][/] An error occurred while trying to auto-update DuoKLI: {e}\n"
-                    f"{traceback.format_exc()}"
-                )
+if __name__ == "__main__":
+    try:
+        _print("\033[?25l")
+        if (version.UPDATE_DIR / "applying.json").exists():
+            # An update was interrupted while it was being applied: put the previous version back and restart on it,
+            #   since some of the modules imported above may be from the new one
+            import updater, os
+            if updater.recover():
+                print("[yellow]An interrupted update was rolled back.[/]")
+                os.execv(sys.executable, [sys.executable, *sys.argv])
+        if AUTOUPDATE:
+            try:
+                import updater
+                updater.start_background_check(config)
+            except Exception as e:
+                if DEBUG:
+                    print(
+                        f"{current_time()} [bold magenta][DEBUG][/] An error occurred while trying to auto-update DuoKLI: {e}\n"
+                        f"{traceback.format_exc()}"
+                    )
     
-    while True:
-        clear()
-        print(title_string())
-        print("\n  [bright_magenta]Accounts: [/]")
-        for i in range(len(config['accounts'])):
-            print(f"  {i+1}: {config['accounts'][i]['username']}")
-        print("\n  [bright_blue]9. Manage Accounts[/]")
-        print("  [bright_red]0. Quit[/]")
         while True:
-            try:
-                account = int(getch())
-                if account == 9:
-                    while True:
-                        clear()
-                        acc_manager_option = ""
-                        acc_manager_menu = [
-                            title_string(),
-                            f"\n  [bright_magenta]Accounts:[/]",
-                            *[f"  {i+1}: {acc['username']}" for i, acc in enumerate(config['accounts'])],
-                            f"\n  [bright_green]A. Add Account with Token[/]",
-                            f"  [bright_green]L. Login with Password[/]",
-                            f"  [bright_yellow]Select an account to edit it.[/]",
-                            f"\n  [bright_red]0. Go Back[/]\n"
-                        ]
-                        for string in acc_manager_menu:
-                            print(string)
-                        while acc_manager_option not in [*[str(i) for i in range(len(config['accounts']) + 1)], "A", "L"]:
-                            acc_manager_option = getch().upper()
-                        clear()
-                        for i, s in enumerate(acc_manager_menu):
-                            print(s if i < 2 or i == len(acc_manager_menu)-1 else f"[bold bright_yellow]{s}[/]" if f" {acc_manager_option.upper()}: " in s else s)
-                        if acc_manager_option == "0":
-                            with open("config.json", "w") as f:
-                                json.dump(config, f, indent=4)
-                            break
-                        elif acc_manager_option.isdigit():
-                            acc_to_update = int(acc_manager_option)-1
-                            print(" [yellow]U. Update Token[/] | [magenta]J. Move Down[/] | [magenta]K. Move Up[/] | [red]R. Remove[/]  [bright_black][Esc to cancel][/]")
-                            while acc_manager_option not in ['\033', 'U', 'J', 'K', 'R']:
+            offer_update()
+            screen.render([
+                title_string(),
+                "\n  [bright_magenta]Accounts: [/]",
+                *[f"  {i+1}: {acc['username']}" for i, acc in enumerate(config['accounts'])],
+                "\n  [bright_blue]9. Manage Accounts[/]",
+                "  [bright_red]0. Quit[/]",
+            ])
+            while True:
+                try:
+                    account = int(getch())
+                    if account == 9:
+                        while True:
+                            acc_manager_option = ""
+                            acc_manager_menu = [
+                                title_string(),
+                                f"\n  [bright_magenta]Accounts:[/]",
+                                *[f"  {i+1}: {acc['username']}" for i, acc in enumerate(config['accounts'])],
+                                f"\n  [bright_green]A. Add Account with Token[/]",
+                                f"  [bright_green]L. Login with Password[/]",
+                                f"  [bright_yellow]Select an account to edit it.[/]",
+                                f"\n  [bright_red]0. Go Back[/]\n"
+                            ]
+                            screen.render(acc_manager_menu)
+                            while acc_manager_option not in [*[str(i) for i in range(len(config['accounts']) + 1)], "A", "L"]:
                                 acc_manager_option = getch().upper()
-                            if acc_manager_option == "\033":
-                                continue
-                            elif acc_manager_option == "U":
+                            screen.render([
+                                s if i < 2 or i == len(acc_manager_menu)-1 else f"[bold bright_yellow]{s}[/]" if f" {acc_manager_option.upper()}: " in s else s
+                                for i, s in enumerate(acc_manager_menu)
+                            ])
+                            if acc_manager_option == "0":
+                                configfile.save()
+                                break
+                            elif acc_manager_option.isdigit():
+                                acc_to_update = int(acc_manager_option)-1
+                                print(" [yellow]U. Update Token[/] | [magenta]J. Move Down[/] | [magenta]K. Move Up[/] | [red]R. Remove[/]  [bright_black][Esc to cancel][/]")
+                                while acc_manager_option not in ['\033', 'U', 'J', 'K', 'R']:
+                                    acc_manager_option = getch().upper()
+                                if acc_manager_option == "\033":
+                                    continue
+                                elif acc_manager_option == "U":
+                                    try:
+                                        new_token = inp("\n Enter your new token")
+                                    except ValueError:
+                                        continue
+                                    if not new_token:
+                                        continue
+                                    print(" [bright_yellow]Updating your account credentials, please wait...[/]", end='\r')
+                                    new_account = fetch_username_and_id(new_token, DEBUG)
+                                    _print("\033[2K", end="")
+                                    if isinstance(new_account, str):
+                                        print(new_account)
+                                        print(" [bright_yellow]Press any key to continue.[/]")
+                                        getch()
+                                        continue
+                                    config['accounts'][acc_to_update]['username'] = new_account['username']
+                                    config['accounts'][acc_to_update]['id'] = new_account['id']
+                                    config['accounts'][acc_to_update]['token'] = new_token
+                                    print(f" [bright_green]Successfully updated account {new_account['username']}![/]")
+                                    print(" [bright_yellow]Press any key to continue.[/]")
+                                    getch()
+                                elif acc_manager_option == "J":
+                                    if acc_to_update != len(config['accounts'])-1:
+                                        config['accounts'][acc_to_update], config['accounts'][acc_to_update+1] = config['accounts'][acc_to_update+1], config['accounts'][acc_to_update]
+                                elif acc_manager_option == "K":
+                                    if acc_to_update != 0:
+                                        config['accounts'][acc_to_update], config['accounts'][acc_to_update-1] = config['accounts'][acc_to_update-1], config['accounts'][acc_to_update]
+                                elif acc_manager_option == "R":
+                                    print(f"\n [bright_red]Are you sure you want to remove {config['accounts'][acc_to_update]['username']}? \\[y/N][/]")
+                                    if getch().upper() in ["Y", "\r"]:
+                                        config['accounts'].pop(acc_to_update)
+                            elif acc_manager_option == "A":
                                 try:
-                                    new_token = inp("\n Enter your new token")
+                                    new_token = inp(" Enter your account's token")
                                 except ValueError:
                                     continue
                                 if not new_token:
                                     continue
-                                print(" [bright_yellow]Updating your account credentials, please wait...[/]", end='\r')
+                                print(" [bright_yellow]Adding your account, please wait...[/]", end='\r')
                                 new_account = fetch_username_and_id(new_token, DEBUG)
                                 _print("\033[2K", end="")
                                 if isinstance(new_account, str):
@@ -584,342 +750,338 @@ try:
                                     print(" [bright_yellow]Press any key to continue.[/]")
                                     getch()
                                     continue
-                                config['accounts'][acc_to_update]['username'] = new_account['username']
-                                config['accounts'][acc_to_update]['id'] = new_account['id']
-                                config['accounts'][acc_to_update]['token'] = new_token
-                                print(f" [bright_green]Successfully updated account {new_account['username']}![/]")
-                                print(" [bright_yellow]Press any key to continue.[/]")
-                                getch()
-                            elif acc_manager_option == "J":
-                                if acc_to_update != len(config['accounts'])-1:
-                                    config['accounts'][acc_to_update], config['accounts'][acc_to_update+1] = config['accounts'][acc_to_update+1], config['accounts'][acc_to_update]
-                            elif acc_manager_option == "K":
-                                if acc_to_update != 0:
-                                    config['accounts'][acc_to_update], config['accounts'][acc_to_update-1] = config['accounts'][acc_to_update-1], config['accounts'][acc_to_update]
-                            elif acc_manager_option == "R":
-                                print(f"\n [bright_red]Are you sure you want to remove {config['accounts'][acc_to_update]['username']}? \\[y/N][/]")
-                                if getch().upper() in ["Y", "\r"]:
-                                    config['accounts'].pop(acc_to_update)
-                        elif acc_manager_option == "A":
-                            try:
-                                new_token = inp(" Enter your account's token")
-                            except ValueError:
-                                continue
-                            if not new_token:
-                                continue
-                            print(" [bright_yellow]Adding your account, please wait...[/]", end='\r')
-                            new_account = fetch_username_and_id(new_token, DEBUG)
-                            _print("\033[2K", end="")
-                            if isinstance(new_account, str):
-                                print(new_account)
+                                config['accounts'].append({
+                                    "username": new_account['username'],
+                                    "id": new_account['id'],
+                                    "token": new_token,
+                                    "autostreak": False,
+                                    "autoleague": {
+                                        "active": False,
+                                        "position": None
+                                    }
+                                })
+                                print(f" [bright_green]Successfully added account {new_account['username']}![/]")
                                 print(" [bright_yellow]Press any key to continue.[/]")
                                 getch()
-                                continue
-                            config['accounts'].append({
-                                "username": new_account['username'],
-                                "id": new_account['id'],
-                                "token": new_token,
-                                "autostreak": False,
-                                "autoleague": {
-                                    "active": False,
-                                    "position": None
-                                }
-                            })
-                            print(f" [bright_green]Successfully added account {new_account['username']}![/]")
-                            print(" [bright_yellow]Press any key to continue.[/]")
-                            getch()
-                        elif acc_manager_option == "L":
-                            try:
-                                identifier = inp(" Enter your email, username or phone number")
-                            except ValueError:
-                                continue
-                            if not identifier:
-                                continue
-
-                            try:
-                                password = inp(" Enter your password", password=True)
-                            except ValueError:
-                                continue
-                            if not password:
-                                continue
-
-                            print(" [bright_yellow]Logging in, please wait...[/]", end='\r')
-                            new_account = login_password(identifier, password, DEBUG)
-                            _print("\033[2K", end="")
-                            if isinstance(new_account, str):
-                                print(new_account)
+                            elif acc_manager_option == "L":
+                                try:
+                                    identifier = inp(" Enter your email, username or phone number")
+                                except ValueError:
+                                    continue
+                                if not identifier:
+                                    continue
+
+                                try:
+                                    password = inp(" Enter your password", password=True)
+                                except ValueError:
+                                    continue
+                                if not password:
+                                    continue
+
+                                print(" [bright_yellow]Logging in, please wait...[/]", end='\r')
+                                new_account = login_password(identifier, password, DEBUG)
+                                _print("\033[2K", end="")
+                                if isinstance(new_account, str):
+                                    print(new_account)
+                                    print(" [bright_yellow]Press any key to continue.[/]")
+                                    getch()
+                                    continue
+                                config['accounts'].append({
+                                    "username": new_account['username'],
+                                    "id": new_account['id'],
+                                    "token": new_account['token'],
+                                    "autostreak": False,
+                                    "autoleague": {
+                                        "active": False,
+                                        "position": None
+                                    }
+                                })
+                                print(f" [bright_green]Successfully added account {new_account['username']}![/]")
                                 print(" [bright_yellow]Press any key to continue.[/]")
                                 getch()
-                                continue
-                            config['accounts'].append({
-                                "username": new_account['username'],
-                                "id": new_account['id'],
-                                "token": new_account['token'],
-                                "autostreak": False,
-                                "autoleague": {
-                                    "active": False,
-                                    "position": None
-                                }
-                            })
-                            print(f" [bright_green]Successfully added account {new_account['username']}![/]")
-                            print(" [bright_yellow]Press any key to continue.[/]")
-                            getch()
 
+                        break
+                    elif account == 0:
+                        print("\n  [bright_red]Exiting program...[/]")
+                        _print("\033[?25h", end="")
+                        sys.exit()
+                    account -= 1
+                    config['accounts'][account]
                     break
-                elif account == 0:
-                    print("\n  [bright_red]Exiting program...[/]")
-                    _print("\033[?25h", end="")
-                    sys.exit()
-                account -= 1
-                config['accounts'][account]
+                except (IndexError, ValueError) as e:
+                    pass
+            if account != 9 and account is not None:
                 break
-            except (IndexError, ValueError) as e:
-                pass
-        if account != 9 and account is not None:
-            break
-
-    while True:
-        option = ""
-        main_menu = [
-            title_string(),
-           f"\n  [bold bright_green]Logged in as {config['accounts'][account]['username']}[/]",
-            "  [bright_yellow]1. XP[/]",
-            "  [bright_cyan]2. Gem[/]",
-            "  [sandy_brown]3. Streak[/]",
-            "  [medium_purple1]4. Super Duolingo[/]",
-            "  [pink1]5. Items Menu[/]",
-            "  [bright_green]6. Saver[/]\n",
-            "  [bright_blue]9. Settings[/]",
-            "  [bright_red]0. Quit[/]\n",
-        ]
-        clear()
-        for string in main_menu:
-            print(string)
-        while option not in ['1', '2', '3', '4', '5', '6', '9', '0']:
-            option = getch().upper()
-        clear()
-        for i, string in enumerate(main_menu):
-            if i < 2:
-                print(string)
-            elif f"{option.upper()}. " in string:
-                print(f"[bold]{string}[/]")
-            else:
-                print(f"  [bright_black]{string.split(']', maxsplit=1)[1]}")
-
-        if option == "1":
-            start_task("XP", account)
-        elif option == "2":
-            while True:
-                methods = {
-                    "1": "gems",
-                    "2": "fast gems",
-                }
-                methods_option = ""
-                clear()
-                methods_menu = [
-                    title_string(),
-                    "\n  [bold bright_blue]Choose a gem farm method:[/]",
-                    "  [bright_cyan]1. Gems[/]",
-                    "  [bright_yellow]2. Fast Gems[/]\n",
-                    "  [bright_red]0. Go Back[/]\n",
-                ]
-                for string in methods_menu:
-                    print(string)
-                while methods_option not in ['1', '2', '0']:
-                    methods_option = getch().upper()
-                clear()
-                for i, string in enumerate(methods_menu):
-                    if i < 2:
-                        print(string)
-                    elif f"{methods_option.upper()}. " in string:
-                        print(f"[bold]{string}[/]")
-                    else:
-                        print(f"  [bright_black]{string.split(']', maxsplit=1)[1]}")
-
-                if methods_option in ['1', '2']:
-                    success = start_task(methods[methods_option], account)
-                    if success:
+
+        while True:
+            offer_update()
+            option = ""
+            unfinished = get_journal().unfinished(config['accounts'][account]['id'])
+            main_menu = [
+                title_string(),
+               f"\n  [bold bright_green]Logged in as {config['accounts'][account]['username']}[/]",
+                "  [bright_yellow]1. XP[/]",
+                "  [bright_cyan]2. Gem[/]",
+                "  [sandy_brown]3. Streak[/]",
+                "  [medium_purple1]4. Super Duolingo[/]",
+                "  [pink1]5. Items Menu[/]",
+                *(["  [bright_green]6. Saver[/]", f"  [bright_white]R. Resume Task ({len(unfinished)})[/]\n"] if unfinished
+                  else ["  [bright_green]6. Saver[/]\n"]),
+                "  [bright_blue]9. Settings[/]",
+                "  [bright_red]0. Quit[/]\n",
+            ]
+            screen.render(main_menu)
+            while option not in ['1', '2', '3', '4', '5', '6', '9', '0'] + (['R'] if unfinished else []):
+                option = getch().upper()
+            screen.render([
+                string if i < 2 else f"[bold]{string}[/]" if f"{option.upper()}. " in string
+                else f"  [bright_black]{string.split(']', maxsplit=1)[1]}"
+                for i, string in enumerate(main_menu)
+            ])
+
+            if option == "1":
+                start_task("XP", account)
+            elif option == "2":
+                while True:
+                    methods = {
+                        "1": "gems",
+                        "2": "fast gems",
+                    }
+                    methods_option = ""
+                    methods_menu = [
+                        title_string(),
+                        "\n  [bold bright_blue]Choose a gem farm method:[/]",
+                        "  [bright_cyan]1. Gems[/]",
+                        "  [bright_yellow]2. Fast Gems[/]\n",
+                        "  [bright_red]0. Go Back[/]\n",
+                    ]
+                    screen.render(methods_menu)
+                    while methods_option not in ['1', '2', '0']:
+                        methods_option = getch().upper()
+                    screen.render([
+                        string if i < 2 else f"[bold]{string}[/]" if f"{methods_option.upper()}. " in string
+                        else f"  [bright_black]{string.split(']', maxsplit=1)[1]}"
+                        for i, string in enumerate(methods_menu)
+                    ])
+
+                    if methods_option in ['1', '2']:
+                        success = start_task(methods[methods_option], account)
+                        if success:
+                            break
+                    elif methods_option == "0":
                         break
-                elif methods_option == "0":
-                    break
-        elif option == "3":
-            start_task("streak days", account)
-        elif option == "4":
-            start_task("Super Duolingo", account, request_amount=False)
-        elif option == "5":
-            while True:
+            elif option == "3":
+                start_task("streak days", account)
+            elif option == "R":
+                while True:
+                    # Only the 9 most recent unfinished tasks, so every one has a single-key option
+                    unfinished = get_journal().unfinished(config['accounts'][account]['id'])[:9]
+                    if not unfinished:
+                        break
+                    resume_option = ""
+                    resume_menu = [
+                        title_string(),
+                        "\n  [bold bright_blue]Choose a task to resume:[/]",
+                        *[f"  [bright_yellow]{i+1}. {task['type'].capitalize() if task['type'] != 'XP' else 'XP'}: {task['done']:,}/{fint(task['target'])}[/]"
+                          f" [bright_black](last progress at {datetime.fromtimestamp(task['t']):%Y-%m-%d %H:%M})[/]"
+                          for i, task in enumerate(unfinished)],
+                        "\n  [bright_red]0. Go Back[/]\n",
+                    ]
+                    screen.render(resume_menu)
+                    while resume_option not in [str(i) for i in range(len(unfinished) + 1)]:
+                        resume_option = getch()
+                    screen.render([
+                        string if i < 2 else f"[bold]{string}[/]" if f"{resume_option}. " in string
+                        else f"  [bright_black]{string.split(']', maxsplit=1)[1]}"
+                        for i, string in enumerate(resume_menu)
+                    ])
+                    if resume_option == "0":
+                        break
+                    task = unfinished[int(resume_option)-1]
+                    print(" [yellow]R. Resume[/] | [red]D. Discard[/]  [bright_black][Esc to cancel][/]")
+                    resume_action = ""
+                    while resume_action not in ['\033', 'R', 'D']:
+                        resume_action = getch().upper()
+                    if resume_action == "R":
+                        start_task(task['type'], account, resume=task)
+                        break
+                    elif resume_action == "D":
+                        get_journal().discard(task['task'])
+            elif option == "4":
+                start_task("Super Duolingo", account, request_amount=False)
+            elif option == "5":
                 items = {
-                    "1": ("society_streak_freeze", "Streak Freeze"),
-                    "2": ("streak_repair", "Streak Repair"),
-                    "3": ("heart_segment", "Heart Segment"),
-                    "4": ("health_refill", "Health Refill"),
-                    "5": ("xp_boost_stackable", "XP Boost Stackable"),
-                    "6": ("general_xp_boost", "General XP Boost"),
-                    "7": ("xp_boost_15", "XP Boost x2 15 Mins"),
-                    "8": ("xp_boost_60", "XP Boost x2 60 Mins"),
-                    "9": ("xp_boost_refill", "XP Boost x3 15 Mins"),
-                    "Q": ("early_bird_xp_boost", "Early Bird XP Boost"),
-                    "W": ("row_blaster_150", "Row Blaster 150"),
-                    "E": ("row_blaster_250", "Row Blaster 250"),
+                    "1": ("society_streak_freeze", "Streak Freeze", "bright_cyan"),
+                    "2": ("streak_repair", "Streak Repair", "sandy_brown"),
+                    "3": ("heart_segment", "Heart Segment", "bright_red"),
+                    "4": ("health_refill", "Health Refill", "bright_red"),
+                    "5": ("xp_boost_stackable", "XP Boost Stackable", "bright_yellow"),
+                    "6": ("general_xp_boost", "General XP Boost", "bright_yellow"),
+                    "7": ("xp_boost_15", "XP Boost x2 15 Mins", "bright_yellow"),
+                    "8": ("xp_boost_60", "XP Boost x2 60 Mins", "bright_yellow"),
+                    "9": ("xp_boost_refill", "XP Boost x3 15 Mins", "bright_yellow"),
+                    "Q": ("early_bird_xp_boost", "Early Bird XP Boost", "bright_yellow"),
+                    "W": ("row_blaster_150", "Row Blaster 150", "bright_magenta"),
+                    "E": ("row_blaster_250", "Row Blaster 250", "bright_magenta"),
                 }
-                items_option = ""
-                clear()
-                items_menu = [
-                    title_string(),
-                    "\n  [bold bright_blue]Choose an item to claim:[/]",
-                    "  [bright_cyan]1. Streak Freeze[/]",
-                    "  [sandy_brown]2. Streak Repair[/]",
-                    "  [bright_red]3. Heart Segment[/]",
-                    "  [bright_red]4. Health Refill[/]",
-                    "  [bright_yellow]5. XP Boost Stackable[/]",
-                    "  [bright_yellow]6. General XP Boost[/]",
-                    "  [bright_yellow]7. XP Boost x2 15 Mins[/]",
-                    "  [bright_yellow]8. XP Boost x2 60 Mins[/]",
-                    "  [bright_yellow]9. XP Boost x3 15 Mins[/]",
-                    "  [bright_yellow]Q. Early Bird XP Boost[/]",
-                    "  [bright_magenta]W. Row Blaster 150[/]",
-                    "  [bright_magenta]E. Row Blaster 250[/]\n",
-                    "  [bright_red]0. Go Back[/]\n",
-                ]
-                for string in items_menu:
-                    print(string)
-                while items_option not in ['1', '2', '3', '4', '5', '6', '7', '8', '9', 'Q', 'W', 'E', '0']:
-                    items_option = getch().upper()
-                clear()
-                for i, string in enumerate(items_menu):
-                    if i < 2:
-                        print(string)
-                    elif f"{items_option.upper()}. " in string:
-                        print(f"[bold]{string}[/]")
-                    else:
-                        print(f"  [bright_black]{string.split(']', maxsplit=1)[1]}")
-
-                if items_option in ['1', '2', '3', '4', '5', '6', '7', '8', '9', 'Q', 'W', 'E']:
-                    print(f" [bright_yellow]Giving \"{items[items_option][1]}\"...[/]", end="")
-                    _print("\r", end="")
-                    give_item(account, items[items_option])
-                    print(" [bright_yellow]Press any key to continue.[/]")
-                    getch()
-                elif items_option == "0":
-                    break
-        elif option == "6":
-            clear()
-            os.system(f"{sys.executable} saver.py")
-            print(" [bright_yellow]Press any key to continue.[/]")
-            getch()
-        elif option == "9":
-            while True:
-                setting_option = ""
-                clear()
-                settings_menu = [
-                    title_string(),
-                    "\n  [bold bright_blue]Settings:[/]",
-                    "  1. Saver Settings: [bold bright_yellow]Configure[/]",
-                    "  2. Debug Mode: " + ( "[bright_green]Enabled[/]" if config["debug"] else "[bright_red]Disabled[/]" ),
-                    "",
-                    "  3. Check Updates",
-                    "  4. Auto update: " + ( "[bright_green]Enabled[/]" if AUTOUPDATE else "[bright_red]Disabled[/]" ),
-                    "",
-                    "  [bright_red]0. Go Back[/]\n",
-                ]
-                if AUTOUPDATE:
-                    settings_menu.insert(-2, "  5. Ask before auto-updating: " + ( "[bright_green]Enabled[/]" if ASK_AUTOUPDATE else "[bright_red]Disabled[/]" ))
-                    if not ASK_AUTOUPDATE:
-                        settings_menu.insert(-2, "  ⚠️ [bright_yellow] Updates are still experimental and may cause issues. Keeping this enabled is recommended.\n  Report any issues through GitHub or Discord.[/]")
-                for string in settings_menu:
-                    print(string)
-                while setting_option not in ['1', '2', '3', '4', '0'] + (['5'] if AUTOUPDATE else []):
-                    setting_option = getch()
+                # Keys of the selected items, in the order they were picked; Enter claims them all in one request
+                selected = []
+                while True:
+                    items_option = ""
+                    items_menu = [
+                        title_string(),
+                        "\n  [bold bright_blue]Choose items to claim:[/] [bright_black](select any number, then press Enter)[/]",
+                        *[f"  [{color}]{key}. {name}[/]" + (" [bold bright_green]✓[/]" if key in selected else "")
+                          for key, (_, name, color) in items.items()],
+                        "",
+                        f"  [bright_green]Enter. Claim {len(selected)} selected item{'s' if len(selected) != 1 else ''}[/]" if selected
+                        else "  [bright_black]Enter. Claim selected items[/]",
+                        "  [bright_red]0. Go Back[/]\n",
+                    ]
+                    screen.render(items_menu)
+                    while items_option not in [*items, '\r', '0']:
+                        items_option = getch().upper()
+
+                    if items_option in items:
+                        if items_option in selected:
+                            selected.remove(items_option)
+                        else:
+                            selected.append(items_option)
+                    elif items_option == "\r" and selected:
+                        screen.render([
+                            string if i < 2 or not string else f"[bold]{string}[/]" if any(string.startswith(f"  [{items[key][2]}]{key}. ") for key in selected)
+                            else f"  [bright_black]{string.split(']', maxsplit=1)[1]}"
+                            for i, string in enumerate(items_menu)
+                        ])
+                        print(f" [bright_yellow]Giving {len(selected)} item{'s' if len(selected) != 1 else ''}...[/]", end="")
+                        _print("\r", end="")
+                        give_items(account, [items[key] for key in selected])
+                        selected = []
+                        print(" [bright_yellow]Press any key to continue.[/]")
+                        getch()
+                        screen.invalidate()
+                    elif items_option == "0":
+                        break
+            elif option == "6":
                 clear()
-                for string in settings_menu:
-                    print(string if settings_menu.index(string) < 2 else f"[bold bright_yellow]{string}[/]" if f"{setting_option.upper()}. " in string else string)
-                if setting_option == "1":
-                    space = max(len(acc['username']) for acc in config['accounts']) + 1
-                    enabled = "[bright_green]✅[/]"
-                    disabled = "[bright_red]❌[/]"
-                    while True:
-                        saver_row_option = ""
-                        saver_col_option = ""
-                        clear()
-                        saver_settings_menu = [
-                            title_string(),
-                           "\n  [bold]" + f"{'Accounts':{space}}" + "  Streaksaver   Leaguesaver   Position[/]",
-                           *[
-                                "  " + str(i + 1) + ". "
-                                + f"{config['accounts'][i]['username']:{space}}"
-                                + "    "
-                                + (enabled if config['accounts'][i]['autostreak'] else disabled)
-                                + " " * 12
-                                + (enabled if config['accounts'][i]['autoleague']['active'] else disabled)
-                                + " " * 10
-                                + (
-                                    str(config['accounts'][i]['autoleague']['position'])
-                                    if config['accounts'][i]['autoleague']['position']
-                                    else disabled
-                                )
-                                for i in range(len(config['accounts']))
-                            ],
-                            "\n  [bright_red]0. Go Back[/]"
-                        ]
-                        for string in saver_settings_menu:
-                            print(string)
-                        while saver_row_option not in [str(i) for i in range(len(config['accounts']) + 1)]:
-                            saver_row_option = getch()
+                import saver
+                saver.run(config, threading.Event())
+                print(" [bright_yellow]Press any key to continue.[/]")
+                getch()
+            elif option == "9":
+                while True:
+                    setting_option = ""
+                    settings_menu = [
+                        title_string(),
+                        "\n  [bold bright_blue]Settings:[/]",
+                        "  1. Saver Settings: [bold bright_yellow]Configure[/]",
+                        "  2. Debug Mode: " + ( "[bright_green]Enabled[/]" if config["debug"] else "[bright_red]Disabled[/]" ),
+                        "",
+                        "  3. Check Updates",
+                        "  4. Auto update: " + ( "[bright_green]Enabled[/]" if AUTOUPDATE else "[bright_red]Disabled[/]" ),
+                        "",
+                        "  6. Profiling: " + ( "[bright_green]Enabled[/]" if profiler.enabled else "[bright_red]Disabled[/]" ),
+                        "",
+                        "  [bright_red]0. Go Back[/]\n",
+                    ]
+                    if AUTOUPDATE:
+                        settings_menu.insert(-4, "  5. Ask before auto-updating: " + ( "[bright_green]Enabled[/]" if ASK_AUTOUPDATE else "[bright_red]Disabled[/]" ))
+                        if not ASK_AUTOUPDATE:
+                            settings_menu.insert(-4, "  ⚠️ [bright_yellow] Updates are still experimental and may cause issues. Keeping this enabled is recommended.\n  Report any issues through GitHub or Discord.[/]")
+                    screen.render(settings_menu)
+                    while setting_option not in ['1', '2', '3', '4', '6', '0'] + (['5'] if AUTOUPDATE else []):
+                        setting_option = getch()
+                    screen.render([
+                        string if i < 2 else f"[bold bright_yellow]{string}[/]" if f"{setting_option.upper()}. " in string else string
+                        for i, string in enumerate(settings_menu)
+                    ])
+                    if setting_option == "1":
+                        space = max(len(acc['username']) for acc in config['accounts']) + 1
+                        enabled = "[bright_green]✅[/]"
+                        disabled = "[bright_red]❌[/]"
+                        while True:
+                            saver_row_option = ""
+                            saver_col_option = ""
+                            saver_settings_menu = [
+                                title_string(),
+                               "\n  [bold]" + f"{'Accounts':{space}}" + "  Streaksaver   Leaguesaver   Position[/]",
+                               *[
+                                    "  " + str(i + 1) + ". "
+                                    + f"{config['accounts'][i]['username']:{space}}"
+                                    + "    "
+                                    + (enabled if config['accounts'][i]['autostreak'] else disabled)
+                                    + " " * 12
+                                    + (enabled if config['accounts'][i]['autoleague']['active'] else disabled)
+                                    + " " * 10
+                                    + (
+                                        str(config['accounts'][i]['autoleague']['position'])
+                                        if config['accounts'][i]['autoleague']['position']
+                                        else disabled
+                                    )
+                                    for i in range(len(config['accounts']))
+                                ],
+                                "\n  [bright_red]0. Go Back[/]"
+                            ]
+                            screen.render(saver_settings_menu)
+                            while saver_row_option not in [str(i) for i in range(len(config['accounts']) + 1)]:
+                                saver_row_option = getch()
+                            screen.render([
+                                string if i < 2 or i == len(saver_settings_menu)-1 else f"[bold bright_yellow]{string}[/]" if f" {saver_row_option.upper()}. " in string else string
+                                for i, string in enumerate(saver_settings_menu)
+                            ])
+                            if saver_row_option == "0":
+                                break
+                            print("\n [sandy_brown]Q. Streaksaver[/] | [bright_green]W. Leaguesaver[/] | [cyan]E. Position[/]  [bright_black][Any other key to cancel][/]")
+                            saver_col_option = getch().upper()
+                            if saver_col_option == "Q":
+                                config['accounts'][int(saver_row_option)-1]['autostreak'] = not config['accounts'][int(saver_row_option)-1]['autostreak']
+                            elif saver_col_option == "W":
+                                config['accounts'][int(saver_row_option)-1]['autoleague']['active'] = not config['accounts'][int(saver_row_option)-1]['autoleague']['active']
+                            elif saver_col_option == "E":
+                                try:
+                                    amount = int(inp("\n Enter league position", ["0 to remove"]))
+                                except ValueError:
+                                    continue
+                                config['accounts'][int(saver_row_option)-1]['autoleague']['position'] = amount if amount >= 1 and amount <= 30 else None
+                    elif setting_option == "2":
+                        DEBUG = config['debug'] = not config['debug']
+                        client.set_debug(DEBUG)
+                    elif setting_option == "3":
                         clear()
-                        for string in saver_settings_menu:
-                            print(string if saver_settings_menu.index(string) < 2 or saver_settings_menu.index(string) == len(saver_settings_menu)-1 else f"[bold bright_yellow]{string}[/]" if f" {saver_row_option.upper()}. " in string else string)
-                        if saver_row_option == "0":
-                            break
-                        print("\n [sandy_brown]Q. Streaksaver[/] | [bright_green]W. Leaguesaver[/] | [cyan]E. Position[/]  [bright_black][Any other key to cancel][/]")
-                        saver_col_option = getch().upper()
-                        if saver_col_option == "Q":
-                            config['accounts'][int(saver_row_option)-1]['autostreak'] = not config['accounts'][int(saver_row_option)-1]['autostreak']
-                        elif saver_col_option == "W":
-                            config['accounts'][int(saver_row_option)-1]['autoleague']['active'] = not config['accounts'][int(saver_row_option)-1]['autoleague']['active']
-                        elif saver_col_option == "E":
-                            try:
-                                amount = int(input("\n Enter league position [Enter to cancel, 0 to remove]: "))
-                            except ValueError:
-                                continue
-                            config['accounts'][int(saver_row_option)-1]['autoleague']['position'] = amount if amount >= 1 and amount <= 30 else None
-                elif setting_option == "2":
-                    DEBUG = config['debug'] = not config['debug']
-                elif setting_option == "3":
-                    clear()
-                    print(title_string())
-                    print("\n  [bright_yellow]Checking for updates...[/]")
-                    updater.check_and_stage_update(apply=True)
-                    print("\n  [bright_yellow]Press any key to continue.[/]")
-                    getch()
-                    account = None
-                    break 
-                elif setting_option == "4":
-                    AUTOUPDATE = config['autoupdate'] = not config.get('autoupdate', False)
-                elif setting_option == "5":
-                    ASK_AUTOUPDATE = config['ask_autoupdate'] = not config.get('ask_autoupdate', True)
-                elif setting_option == "0":
-                    with open("config.json", "w") as f:
-                        json.dump(config, f, indent=4)
-                    break
-        elif option == "0":
-            print("  [bright_red]Exiting program...[/]")
-            with open("config.json", "w") as f:
-                json.dump(config, f, indent=4)
-            _print("\033[?25h", end="")
-            sys.exit(0)
-
-except KeyboardInterrupt:
-    print("\n\n  [bright_red]Exiting program...[/]")
-    with open("config.json", "w") as f:
-        json.dump(config, f, indent=4)
-    _print("\033[?25h", end="")
-    sys.exit(0)
-
-except Exception as e:
-    print(f"[red][bold]An unexpected error occurred: {e}[/]\nDetailed error:[/]")
-    traceback.print_exc()
-    print("\n  [bright_red]Exiting program...[/]")
-    with open("config.json", "w") as f:
-        json.dump(config, f, indent=4)
-    _print("\033[?25h", end="")
-    sys.exit(1)
+                        print(title_string())
+                        print("\n  [bright_yellow]Checking for updates...[/]")
+                        import updater
+                        updater.check_and_stage_update(apply=True)
+                        print("\n  [bright_yellow]Press any key to continue.[/]")
+                        getch()
+                        account = None
+                        break 
+                    elif setting_option == "4":
+                        AUTOUPDATE = config['autoupdate'] = not config.get('autoupdate', False)
+                    elif setting_option == "5":
+                        ASK_AUTOUPDATE = config['ask_autoupdate'] = not config.get('ask_autoupdate', True)
+                    elif setting_option == "6":
+                        config['profile'] = not config.get('profile', False)
+                        profiler.configure(config)
+                    elif setting_option == "0":
+                        configfile.save()
+                        break
+            elif option == "0":
+                print("  [bright_red]Exiting program...[/]")
+                configfile.save()
+                _print("\033[?25h", end="")
+                sys.exit(0)
+
+    except KeyboardInterrupt:
+        print("\n\n  [bright_red]Exiting program...[/]")
+        configfile.save()
+        _print("\033[?25h", end="")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"[red][bold]An unexpected error occurred: {e}[/]\nDetailed error:[/]")
+        traceback.print_exc()
+        print("\n  [bright_red]Exiting program...[/]")
+        configfile.save()
+        _print("\033[?25h", end="")
+        sys.exit(1)
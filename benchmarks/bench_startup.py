@@ -0,0 +1,90 @@
+import argparse, os, re, statistics, subprocess, sys, tempfile, json
+from pathlib import Path
+
+# Cold-start budget: imports DuoKLI (everything needed to show the menu) in fresh interpreters with
+#   `python -X importtime` and reports the median cumulative import time and the slowest modules.
+# Exits with 1 if the median is above --threshold-ms, or if a module that should only be loaded on demand
+#   (see DEFERRED) was imported at startup.
+#
+# Usage:
+#   python benchmarks/bench_startup.py                      # 7 runs, default threshold
+#   python benchmarks/bench_startup.py --runs 15 --top 20   # more runs, longer module list
+#   python benchmarks/bench_startup.py --threshold-ms 40
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_THRESHOLD_MS = 60
+
+# Only imported when a feature needs them
+DEFERRED = [
+    "requests", "urllib3", "rich.progress", "pytz", "tzlocal", "concurrent.futures",
+    "logging.handlers", "sqlite3", "saver", "updater", "cProfile", "pstats", "tracemalloc",
+]
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+def measure(workdir: str) -> tuple[int, dict[str, int]]:
+    # Returns DuoKLI's cumulative import time and the self time of every module it pulled in, in microseconds
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import DuoKLI"],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": str(REPO_DIR)},
+        stdin=subprocess.DEVNULL, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else f"exit code {proc.returncode}")
+
+    # -X importtime lists a package's imports before the package itself, so everything between the
+    #   previous top-level entry and "DuoKLI" was imported on DuoKLI's behalf
+    total, modules, pending = None, {}, {}
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        pending[name] = self_us
+        if len(indent) == 0:
+            if name == "DuoKLI":
+                total, modules = cumulative_us, pending
+            pending = {}
+    if total is None:
+        raise RuntimeError("DuoKLI wasn't imported")
+    return total, modules
+
+def run(runs: int) -> tuple[list[int], dict[str, int]]:
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(Path(workdir) / "config.json", "w") as f:
+            json.dump({"accounts": [], "delay": 900, "debug": False}, f)
+        # The first run compiles bytecode and warms the OS file cache; it isn't counted
+        measure(workdir)
+        totals, modules = [], {}
+        for _ in range(runs):
+            total, mods = measure(workdir)
+            totals.append(total)
+            for name, us in mods.items():
+                modules.setdefault(name, []).append(us)
+    return totals, {name: statistics.median(us) for name, us in modules.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import time budget for DuoKLI.")
+    parser.add_argument("--runs", type=int, default=7, help="number of measured runs (default: 7)")
+    parser.add_argument("--threshold-ms", type=float, default=DEFAULT_THRESHOLD_MS,
+                        help=f"fail if the median import time is above this (default: {DEFAULT_THRESHOLD_MS})")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to list (default: 10)")
+    args = parser.parse_args()
+
+    totals, modules = run(args.runs)
+    median_ms = statistics.median(totals) / 1000
+    print(f"DuoKLI import: median {median_ms:.1f} ms, min {min(totals) / 1000:.1f} ms, max {max(totals) / 1000:.1f} ms over {args.runs} runs")
+    print(f"{len(modules)} modules imported; slowest (self time):")
+    for name, us in sorted(modules.items(), key=lambda x: x[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:7.2f} ms  {name}")
+
+    failures = []
+    if median_ms > args.threshold_ms:
+        failures.append(f"median import time {median_ms:.1f} ms is above the {args.threshold_ms:g} ms threshold")
+    eager = [name for name in DEFERRED if name in modules]
+    if eager:
+        failures.append(f"imported at startup but should be deferred: {', '.join(eager)}")
+    if failures:
+        print("\nStartup regressed:\n  " + "\n  ".join(failures))
+        sys.exit(1)
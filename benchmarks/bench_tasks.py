@@ -0,0 +1,202 @@
+import argparse, contextlib, io, json, os, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from urllib.request import Request, urlopen
+
+# Measures DuoKLI's own client-side cost per request by running the task functions against the offline stub server.
+# Each scenario runs in a fresh interpreter so peak RSS is attributed to that scenario only.
+#
+# Usage:
+#   python benchmarks/bench_tasks.py                          # run everything and print a table
+#   python benchmarks/bench_tasks.py --save bench.json        # store the results as a baseline
+#   python benchmarks/bench_tasks.py --baseline bench.json    # fail (exit 1) if a metric regressed past --tolerance
+#   python benchmarks/bench_tasks.py xp_farm fast_gem_farm    # only run some scenarios
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stub_server import StubServer, redirect_requests
+
+USER_ID = 424242
+ACCOUNT = {
+    "username": f"stub_user_{USER_ID}",
+    "id": USER_ID,
+    "token": f"stub.{USER_ID}.signature",
+    "autostreak": True,
+    "autoleague": {"active": True, "position": 1},
+}
+
+ITEMS = [
+    ("society_streak_freeze", "Streak Freeze", "bright_cyan"),
+    ("health_refill", "Health Refill", "bright_red"),
+    ("xp_boost_15", "XP Boost x2 15 Mins", "bright_yellow"),
+    ("xp_boost_refill", "XP Boost x3 15 Mins", "bright_yellow"),
+]
+
+def _repeat(n, fn):
+    def run(m):
+        for _ in range(n):
+            fn(m)
+    return run
+
+# name -> function taking a namespace with the imported DuoKLI, saver and utils modules
+SCENARIOS = {
+    "get_duo_info":      _repeat(50, lambda m: m.utils.get_duo_info(0, tuple(m.utils.PROFILE_FIELDS), max_age=0)),
+    "xp_farm":           lambda m: m.DuoKLI.xp_farm(50_000, 0),
+    "gem_farm":          lambda m: m.DuoKLI.gem_farm(3_000, 0),
+    "fast_gem_farm":     lambda m: m.DuoKLI.fast_gem_farm(30_000, 0),
+    "streak_farm":       lambda m: m.DuoKLI.streak_farm(50, 0),
+    "give_items":        _repeat(5, lambda m: m.DuoKLI.give_items(0, ITEMS)),
+    "activate_super":    _repeat(20, lambda m: m.DuoKLI.activate_super(0)),
+    "saver_save_streak": _repeat(20, lambda m: m.saver.save_streak(0)),
+    "saver_save_league": _repeat(10, lambda m: m.saver.save_league(0, 1)),
+    "saver_leaderboard_registration": _repeat(5, lambda m: m.saver.leaderboard_registration(0)),
+}
+
+# Metrics compared against a baseline; all of them are "lower is better"
+COMPARED = ["connections", "cpu_ms_per_req", "traced_peak_kib", "rss_peak_kib"]
+
+def stub_call(stub_url: str, path: str, method: str = "GET", body: dict = None) -> dict:
+    data = json.dumps(body).encode() if body is not None else (b"" if method == "POST" else None)
+    with urlopen(Request(stub_url + path, data=data, method=method)) as r:
+        return json.load(r)
+
+def peak_rss_kib() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB everywhere else
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def run_child(name: str, stub_url: str, workdir: str, show_output: bool) -> dict:
+    os.chdir(workdir)
+    with redirect_requests(stub_url):
+        import DuoKLI, saver, utils
+        modules = argparse.Namespace(DuoKLI=DuoKLI, saver=saver, utils=utils)
+        scenario = SCENARIOS[name]
+        sink = contextlib.nullcontext() if show_output else contextlib.redirect_stdout(io.StringIO())
+
+        stub_call(stub_url, "/__stub/reset", "POST")
+        rss_before = peak_rss_kib()
+        with sink:
+            cpu, wall = time.process_time(), time.perf_counter()
+            scenario(modules)
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        stats = stub_call(stub_url, "/__stub/stats")
+        rss_after = peak_rss_kib()
+
+        # Second pass with tracemalloc on, so its overhead doesn't skew the CPU timings above
+        stub_call(stub_url, "/__stub/reset", "POST")
+        tracemalloc.start()
+        with sink:
+            before = tracemalloc.take_snapshot()
+            scenario(modules)
+            after = tracemalloc.take_snapshot()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        net_blocks = sum(s.count_diff for s in after.compare_to(before, "filename"))
+
+    requests = max(stats["requests"], 1)
+    return {
+        "scenario": name,
+        "requests": stats["requests"],
+        "connections": stats["connections"],
+        "wall_s": round(wall, 3),
+        "cpu_ms_per_req": round(cpu * 1000 / requests, 3),
+        "kib_in_per_req": round(stats["bytes_out"] / 1024 / requests, 2),
+        "kib_out_per_req": round(stats["bytes_in"] / 1024 / requests, 2),
+        "traced_peak_kib": round(traced_peak / 1024, 1),
+        "net_blocks": net_blocks,
+        "rss_peak_kib": rss_after,
+        "rss_growth_kib": rss_after - rss_before if rss_after is not None else None,
+        "by_route": stats["by_route"],
+    }
+
+def run_all(names: list[str], latency: float, error_rate: float, show_output: bool) -> list[dict]:
+    results = []
+    with StubServer(latency=latency, error_rate=error_rate) as server, tempfile.TemporaryDirectory() as workdir:
+        with open(Path(workdir) / "config.json", "w") as f:
+            json.dump({"accounts": [ACCOUNT], "delay": 900, "debug": False}, f, indent=4)
+        for name in names:
+            proc = subprocess.run(
+                [sys.executable, __file__, "--child", name, "--stub", server.url, "--workdir", workdir]
+                + (["--show-output"] if show_output else []),
+                stdin=subprocess.DEVNULL, capture_output=not show_output, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{name}: failed\n{proc.stderr or ''}", file=sys.stderr)
+                results.append({"scenario": name, "error": (proc.stderr or "").strip().splitlines()[-1:]})
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]) if proc.stdout else {})
+    return results
+
+def print_table(results: list[dict]):
+    columns = ["scenario", "requests", "connections", "wall_s", "cpu_ms_per_req", "kib_in_per_req", "traced_peak_kib", "rss_peak_kib"]
+    widths = [max(len(c), *(len(str(r.get(c, ""))) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        if "error" in r:
+            print(f"{r['scenario'].ljust(widths[0])}  error: {r['error']}")
+            continue
+        print("  ".join(str(r.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
+
+def compare(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path, "r") as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["scenario"])
+        if not base or "error" in base:
+            continue
+        if "error" in r:
+            regressions.append(f"{r['scenario']}: failed to run")
+            continue
+        for metric in COMPARED:
+            old, new = base.get(metric), r.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > 0.01:
+                regressions.append(f"{r['scenario']}: {metric} {old} -> {new} (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Client-side CPU/memory benchmarks for DuoKLI's task functions.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that fail with status 500")
+    parser.add_argument("--save", metavar="FILE", help="write the results to FILE as a JSON baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against a baseline written with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (default: 0.25)")
+    parser.add_argument("--show-output", action="store_true", help="don't hide the task functions' terminal output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--stub", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args.child, args.stub, args.workdir, args.show_output)
+        sys.stdout.flush()
+        print(json.dumps(result), file=sys.__stdout__)
+        sys.exit(0)
+
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = run_all(args.scenarios or list(SCENARIOS), args.latency, args.error_rate, args.show_output)
+    print_table(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=4)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions.")
@@ -0,0 +1,375 @@
+import json, random, re, sys, threading, time, uuid, argparse, hashlib
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Offline stand-in for the Duolingo endpoints DuoKLI talks to.
+# Every host (www, stories, ios-api-2, leaderboards...) is served from the same port and routed by path only.
+#
+# Usage:
+#   python benchmarks/stub_server.py --port 8765 --latency 0.05 --error-rate 0.1 --error-status 500
+#
+# Control endpoints (not part of the Duolingo API):
+#   GET  /__stub/stats  -> {"requests": n, "connections": n, "bytes_in": n, "bytes_out": n, "by_route": {...}}
+#   POST /__stub/reset  -> resets counters and account state
+#   POST /__stub/config -> {"latency": s, "jitter": s, "error_rate": f, "error_status": n, "retry_after": s}
+
+COHORT_SIZE = 30
+# Size of the padding added to unprojected user documents, to mimic the real multi-hundred-KB response
+FULL_PROFILE_PADDING = 256 * 1024
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.by_route: dict[str, int] = {}
+            self.users: dict[int, dict] = {}
+            self.private: dict[int, bool] = {}
+            self.sessions: dict[str, dict] = {}
+
+    def user(self, user_id: int) -> dict:
+        if user_id not in self.users:
+            yesterday = date.today() - timedelta(days=1)
+            self.users[user_id] = {
+                "id": user_id,
+                "username": f"stub_user_{user_id}",
+                "fromLanguage": "en",
+                "learningLanguage": "fr",
+                "timezone": "UTC",
+                "totalXp": 0,
+                "gems": 0,
+                "streakData": {
+                    "currentStreak": {
+                        "startDate": "2024-01-01",
+                        "lastExtendedDate": yesterday.isoformat(),
+                        "length": (yesterday - date(2024, 1, 1)).days + 1,
+                    }
+                },
+                # Everyone else in the cohort starts ahead, so the league saver always has work to do
+                "cohort": [{"user_id": 10_000 + i, "score": 1500 - i * 40, "display_name": f"rival{i}"} for i in range(COHORT_SIZE - 1)],
+                "score": 0,
+            }
+        return self.users[user_id]
+
+class StubConfig:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 500,
+                 retry_after: float | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "DuoStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        # One handler instance per TCP connection, so this counts connections (handshakes with a real server)
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def dispatch(self, method: str):
+        length = int(self.headers.get("content-length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        path, query = parts.path, parse_qs(parts.query)
+        state: StubState = self.server.state
+        cfg: StubConfig = self.server.config
+
+        if path.startswith("/__stub/"):
+            return self.handle_control(method, path, raw)
+
+        route, handler = self.route(method, path)
+        with state.lock:
+            state.requests += 1
+            state.bytes_in += len(raw)
+            state.by_route[route] = state.by_route.get(route, 0) + 1
+
+        if cfg.latency or cfg.jitter:
+            time.sleep(cfg.latency + random.uniform(0, cfg.jitter))
+        if handler is None:
+            return self.send_json(404, {"error": "NOT_FOUND", "path": path})
+        if cfg.error_rate and random.random() < cfg.error_rate:
+            headers = {"retry-after": str(cfg.retry_after)} if cfg.retry_after is not None else None
+            return self.send_json(cfg.error_status, {"error": "INJECTED", "status": cfg.error_status}, headers=headers)
+
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            return self.send_json(400, {"error": "BAD_JSON"})
+        self.request_path = path
+        status, payload = handler(self, body, query)
+        self.send_json(status, payload, conditional=method == "GET")
+
+    def route(self, method: str, path: str):
+        for m, pattern, name, handler in ROUTES:
+            if m == method:
+                match = re.fullmatch(pattern, path)
+                if match:
+                    self.params = match.groupdict()
+                    return name, handler
+        return f"{method} unknown", None
+
+    def send_json(self, status: int, payload, conditional: bool = False, headers: dict | None = None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        etag = None
+        if conditional and status == 200:
+            # GET responses carry an ETag and honour If-None-Match, like a conditional-request-aware server
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if self.headers.get("if-none-match") == etag:
+                status, data = 304, b""
+        with self.server.state.lock:
+            self.server.state.bytes_out += len(data)
+            if status == 304:
+                self.server.state.by_route["304 Not Modified"] = self.server.state.by_route.get("304 Not Modified", 0) + 1
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        if etag:
+            self.send_header("etag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_control(self, method: str, path: str, raw: bytes):
+        state: StubState = self.server.state
+        if path == "/__stub/stats":
+            with state.lock:
+                stats = {"requests": state.requests, "connections": state.connections, "bytes_in": state.bytes_in, "bytes_out": state.bytes_out, "by_route": dict(state.by_route)}
+            return self.send_json(200, stats)
+        if path == "/__stub/reset" and method == "POST":
+            state.reset()
+            return self.send_json(200, {})
+        if path == "/__stub/config" and method == "POST":
+            for k, v in json.loads(raw or b"{}").items():
+                setattr(self.server.config, k, v)
+            return self.send_json(200, vars(self.server.config))
+        self.send_json(404, {"error": "NOT_FOUND"})
+
+    # Duolingo endpoints -------------------------------------------------------------------------------------------
+
+    def user_id(self) -> int:
+        return int(self.params["user_id"])
+
+    def get_user(self, body, query):
+        with self.server.state.lock:
+            user = dict(self.server.state.user(self.user_id()))
+        user.pop("cohort"), user.pop("score")
+        if "fields" in query:
+            fields = query["fields"][0].split(",")
+            return 200, {f: user[f] for f in fields if f in user}
+        user["_padding"] = "x" * FULL_PROFILE_PADDING
+        return 200, user
+
+    def login(self, body, query):
+        user_id = abs(hash(body.get("identifier", ""))) % 10**9
+        return 200, {"id": user_id, "username": f"stub_user_{user_id}"}
+
+    def create_session(self, body, query):
+        session_id = uuid.uuid4().hex
+        session = {
+            "id": session_id,
+            "type": body.get("type"),
+            "fromLanguage": body.get("fromLanguage"),
+            "learningLanguage": body.get("learningLanguage"),
+            "challenges": [{"type": t, "prompt": f"prompt {i}", "choices": ["a", "b", "c", "d"]}
+                           for i, t in enumerate(body.get("challengeTypes", [])[:20])],
+        }
+        with self.server.state.lock:
+            self.server.state.sessions[session_id] = session
+        return 200, session
+
+    def update_session(self, body, query):
+        with self.server.state.lock:
+            session = self.server.state.sessions.pop(self.params["session_id"], None)
+        if session is None:
+            return 404, {"error": "SESSION_NOT_FOUND"}
+        return 200, {**session, "xpGain": 10, "startTime": body.get("startTime"), "endTime": body.get("endTime")}
+
+    def complete_story(self, body, query):
+        awarded = 30 + max(0, int(body.get("happyHourBonusXp", 0)))
+        return 200, {"awardedXp": awarded, "storyId": self.params["story"]}
+
+    def reward(self, body, query):
+        with self.server.state.lock:
+            self.server.state.user(self.user_id())["gems"] += 30
+        return 200, {"consumed": True, "rewardId": self.params["reward"]}
+
+    def shop_item(self, body, query):
+        # The 2017-06-30 endpoint takes the item as "itemName", the 2023-05-23 one as "id"
+        item = body.get("itemName") if "/2017-06-30/" in self.request_path else body.get("id")
+        if not item:
+            return 400, {"error": "MISSING_ITEM"}
+        return 200, {"purchaseId": uuid.uuid4().hex, "itemName": item}
+
+    def batch(self, body, query):
+        # Every sub-request is routed and handled like a request of its own; its result comes back in order
+        responses = []
+        for sub in body.get("requests", []):
+            parts = urlsplit(sub.get("url", ""))
+            _, handler = self.route(sub.get("method", "GET"), parts.path)
+            if handler is None:
+                responses.append({"status": 404, "body": json.dumps({"error": "NOT_FOUND", "path": parts.path})})
+                continue
+            try:
+                sub_body = json.loads(sub.get("body") or "{}")
+            except ValueError:
+                responses.append({"status": 400, "body": json.dumps({"error": "BAD_JSON"})})
+                continue
+            self.request_path = parts.path
+            status, payload = handler(self, sub_body, parse_qs(parts.query))
+            responses.append({"status": status, "body": json.dumps(payload)})
+        return 200, {"responses": responses}
+
+    def leaderboard(self, body, query):
+        with self.server.state.lock:
+            user = self.server.state.user(self.user_id())
+            if self.server.state.private.get(self.user_id()):
+                return 200, {"active": None}
+            rankings = sorted(user["cohort"] + [{"user_id": user["id"], "score": user["score"], "display_name": user["username"]}],
+                              key=lambda u: u["score"], reverse=True)
+        end = time.gmtime(time.time() + 3 * 86400)
+        return 200, {
+            "active": {
+                "cohort": {"cohort_id": "stub", "rankings": rankings, "tier": 0},
+                "contest": {"contest_end": time.strftime("%Y-%m-%dT%H:%M:%SZ", end)},
+            }
+        }
+
+    def get_privacy(self, body, query):
+        with self.server.state.lock:
+            private = self.server.state.private.get(self.user_id(), False)
+        return 200, {"privacySettings": [{"id": "disable_social", "enabled": private}]}
+
+    def set_privacy(self, body, query):
+        with self.server.state.lock:
+            self.server.state.private[self.user_id()] = bool(body.get("DISABLE_SOCIAL"))
+        return self.get_privacy(body, query)
+
+def _track_xp(handler):
+    def wrapper(self, body, query):
+        status, payload = handler(self, body, query)
+        # Stories are completed by the XP farms; credit the user's leaderboard score like the real service does
+        # (the saver's farm_xp sends no trace id, so fall back to the user id inside the stub token)
+        match = re.search(r"User=(\d+)", self.headers.get("x-amzn-trace-id") or "") \
+            or re.search(r"jwt_token=stub\.(\d+)\.", self.headers.get("cookie") or "")
+        if status == 200 and match:
+            with self.server.state.lock:
+                self.server.state.user(int(match.group(1)))["score"] += payload["awardedXp"]
+        return status, payload
+    return wrapper
+
+ROUTES = [
+    ("GET",   r"/2017-06-30/users/(?P<user_id>\d+)", "GET users", StubHandler.get_user),
+    ("POST",  r"/2023-05-23/login", "POST login", StubHandler.login),
+    ("POST",  r"/2017-06-30/sessions", "POST sessions", StubHandler.create_session),
+    ("PUT",   r"/2017-06-30/sessions/(?P<session_id>\w+)", "PUT sessions", StubHandler.update_session),
+    ("POST",  r"/api2/stories/(?P<story>[\w-]+)/complete", "POST stories complete", _track_xp(StubHandler.complete_story)),
+    ("PATCH", r"/2017-06-30/users/(?P<user_id>\d+)/rewards/(?P<reward>.+)", "PATCH rewards", StubHandler.reward),
+    ("POST",  r"/2017-06-30/users/(?P<user_id>\d+)/shop-items", "POST shop-items", StubHandler.shop_item),
+    ("POST",  r"/2023-05-23/users/(?P<user_id>\d+)/shop-items", "POST shop-items", StubHandler.shop_item),
+    ("POST",  r"/2023-05-23/batch", "POST batch", StubHandler.batch),
+    ("GET",   r"/leaderboards/[\w-]+/users/(?P<user_id>\d+)", "GET leaderboards", StubHandler.leaderboard),
+    ("GET",   r"/2017-06-30/users/(?P<user_id>\d+)/privacy-settings", "GET privacy-settings", StubHandler.get_privacy),
+    ("PATCH", r"/2017-06-30/users/(?P<user_id>\d+)/privacy-settings", "PATCH privacy-settings", StubHandler.set_privacy),
+]
+
+class StubServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **config):
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = StubState()
+        self.httpd.config = StubConfig(**config)
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def state(self) -> StubState:
+        return self.httpd.state
+
+    @property
+    def config(self) -> StubConfig:
+        return self.httpd.config
+
+    def start(self) -> "StubServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="duo-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+_DUOLINGO_URL = re.compile(r"^https://[\w.-]*duolingo\.com")
+
+@contextmanager
+def redirect_requests(base_url: str):
+    # Points every `requests` call aimed at *.duolingo.com to the stub, keeping the path and query intact.
+    # Everything goes through Session.request, including the module-level requests.get/post/... helpers.
+    import requests
+    original = requests.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        return original(self, method, _DUOLINGO_URL.sub(base_url, url), *args, **kwargs)
+
+    requests.Session.request = request
+    try:
+        yield
+    finally:
+        requests.Session.request = original
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Duolingo endpoints used by DuoKLI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="fixed delay added to every response, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After header sent with injected errors, in seconds")
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after)
+    print(f"Duolingo stub listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
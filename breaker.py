@@ -0,0 +1,88 @@
+import threading, time
+
+# Circuit breaker for rate limiting, one per account, checked by client.request before anything is sent.
+#   closed    -> requests go out normally
+#   open      -> Duolingo signalled rate limiting; nothing is sent until the cool-down has passed
+#   half-open -> the cool-down has passed; a single probe request goes out, and its result either
+#                closes the circuit or reopens it with a doubled cool-down
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+DEFAULTS = {
+    "breaker_cooldown": 60,        # first cool-down when the server doesn't say how long to wait, in seconds
+    "breaker_max_cooldown": 900,   # cool-downs double after every failed probe, up to this
+}
+
+_settings = dict(DEFAULTS)
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_in: float):
+        super().__init__(f"Rate limited, not sending requests for another {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.cooldown = _settings["breaker_cooldown"]
+        self.open_until = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        with self.lock:
+            return max(0.0, self.open_until - time.monotonic()) if self.state != CLOSED else 0.0
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() < self.open_until:
+                    return False
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpen(self.retry_in())
+
+    def success(self):
+        with self.lock:
+            if self.state == OPEN:
+                # A request sent before the circuit opened; only the half-open probe can close it
+                return
+            self.state = CLOSED
+            self.cooldown = _settings["breaker_cooldown"]
+            self.probing = False
+
+    def release(self):
+        # The probe didn't get an answer (e.g. a connection error), so let the next request probe instead
+        with self.lock:
+            self.probing = False
+
+    def trip(self, wait: float | None = None):
+        # `wait` is the server's Retry-After, if it sent one
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, _settings["breaker_max_cooldown"])
+            self.state = OPEN
+            self.probing = False
+            self.open_until = max(self.open_until, time.monotonic() + (wait if wait is not None else self.cooldown))
+
+_breakers: dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+
+def configure(config: dict):
+    for k in DEFAULTS:
+        _settings[k] = config.get(k, DEFAULTS[k])
+
+def get(key: str = "") -> CircuitBreaker:
+    with _lock:
+        circuit = _breakers.get(key)
+        if circuit is None:
+            circuit = _breakers[key] = CircuitBreaker()
+        return circuit
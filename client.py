@@ -0,0 +1,198 @@
+import time, threading, atexit, random
+import metrics, logger, breaker, profiler
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import requests
+
+# Every request to Duolingo goes through `request`, which records it in `metrics.registry`
+#   and, in debug mode, queues a line for the debug log (see logger.py).
+# Requests are sent on one pooled `requests.Session` per account (keyed by the authorization header),
+#   so connections and TLS sessions are reused instead of being set up again for every call.
+# `requests` (with urllib3, certifi...) is a large part of DuoKLI's startup time, so it's only imported
+#   when the first session is created.
+# Rate limits are handled in two layers. A 429 (or a 403 with Retry-After) asking for a short wait is retried
+#   in `request` with backoff, and the account's other requests wait out the same block. Once the retries
+#   run out, the server asks for a longer wait, or a plain 403 comes back, the account's circuit breaker
+#   (see breaker.py, keyed like the sessions) opens, and until the cool-down has passed `request` raises
+#   breaker.CircuitOpen instead of sending anything.
+
+DEBUG = False
+
+TIMEOUT = 10            # default timeout for every request, in seconds
+POOL_SIZE = 32          # connections kept per host and session; fast gem farming uses up to this many threads
+RATE_LIMITED = (429, 403)
+MAX_ATTEMPTS = 4        # attempts per request while rate limited, before the circuit breaker takes over
+BACKOFF_BASE = 1.0      # first backoff when the server doesn't send Retry-After; doubles per attempt
+MAX_BACKOFF = 10.0      # longer waits aren't retried here, they open the circuit breaker instead
+
+_sessions: dict[str, "requests.Session"] = {}
+_blocked_until: dict[str, float] = {}
+_sessions_lock = threading.Lock()
+
+# Validators and parsed bodies of earlier GET responses, per URL, for conditional requests (see `get_json`)
+_conditional_cache: dict[str, tuple[str | None, str | None, object, int]] = {}
+_conditional_lock = threading.Lock()
+conditional_stats = {"requests": 0, "not_modified": 0, "bytes_saved": 0, "parses_saved": 0}
+
+def set_debug(enabled: bool):
+    global DEBUG
+    DEBUG = enabled
+
+def session(key: str = "") -> "requests.Session":
+    with _sessions_lock:
+        s = _sessions.get(key)
+        if s is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[key] = s
+        return s
+
+def close_sessions():
+    with _sessions_lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+
+atexit.register(close_sessions)
+
+def retry_after(response: "requests.Response") -> float | None:
+    # Seconds the server asked us to wait, from a Retry-After header in either seconds or HTTP-date form
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff(response: "requests.Response", attempt: int) -> float | None:
+    # How long to wait before retrying `response`, or None if it shouldn't be retried here
+    wait = retry_after(response)
+    if response.status_code == 429:
+        if wait is None:
+            wait = BACKOFF_BASE * 2 ** attempt * random.uniform(1, 1.5)
+    elif response.status_code != 403 or wait is None:
+        # A 403 without Retry-After is a real "forbidden" (e.g. an expired token), retrying won't help
+        return None
+    return wait
+
+def send(method: str, url: str, endpoint: str, key: str, **kwargs) -> "requests.Response":
+    # Requests for an account that was just told to back off wait instead of hitting the server again
+    with _sessions_lock:
+        wait = _blocked_until.get(key, 0) - time.monotonic()
+    if wait > 0:
+        time.sleep(min(wait, MAX_BACKOFF))
+
+    start = time.perf_counter()
+    try:
+        response = session(key).request(method, url, **kwargs)
+    except Exception as e:
+        metrics.registry.record(endpoint, None, time.perf_counter() - start)
+        profiler.record("request", time.perf_counter() - start)
+        if DEBUG:
+            logger.debug("%s failed: %s", endpoint, e)
+        raise
+    elapsed = time.perf_counter() - start
+    profiler.record("request", elapsed)
+
+    body = response.request.body
+    metrics.registry.record(endpoint, response.status_code, elapsed, len(response.content), len(body) if body else 0)
+    if DEBUG:
+        if response.ok:
+            logger.debug("%s -> %s (%.0f ms)", endpoint, response.status_code, elapsed * 1000)
+        else:
+            logger.debug("%s -> %s (%.0f ms): %s", endpoint, response.status_code, elapsed * 1000, logger.Body(response))
+    return response
+
+def request(method: str, url: str, retry: bool = False, **kwargs) -> "requests.Response":
+    # `retry` marks a caller-level retry (e.g. a farm loop repeating a failed iteration) for the metrics.
+    # Short rate limits are retried here with backoff, honouring Retry-After, up to MAX_ATTEMPTS times;
+    #   raises breaker.CircuitOpen without sending anything while the account's circuit is open.
+    endpoint = metrics.endpoint_name(method, url)
+    kwargs.setdefault("timeout", TIMEOUT)
+    key = (kwargs.get("headers") or {}).get("authorization", "")
+    circuit = breaker.get(key)
+    circuit.check()
+    if retry:
+        metrics.registry.record_retry(endpoint)
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            response = send(method, url, endpoint, key, **kwargs)
+        except Exception:
+            circuit.release()
+            raise
+        if response.status_code not in RATE_LIMITED:
+            circuit.success()
+            return response
+        wait = backoff(response, attempt)
+        if wait is None or wait > MAX_BACKOFF or attempt == MAX_ATTEMPTS - 1:
+            break
+        with _sessions_lock:
+            _blocked_until[key] = max(_blocked_until.get(key, 0), time.monotonic() + wait)
+        if DEBUG:
+            logger.debug("%s rate limited (%s), retrying in %.1f s", endpoint, response.status_code, wait)
+        metrics.registry.record_retry(endpoint)
+        # `send` waits for the block to pass before the next attempt
+
+    # Retry-After is honoured as the cool-down; without it the breaker's own (doubling) cool-down applies
+    circuit.trip(retry_after(response))
+    if DEBUG:
+        logger.debug("%s rate limited (%s), circuit open for %.0f s", endpoint, response.status_code, circuit.retry_in())
+    return response
+
+def get(url: str, **kwargs) -> "requests.Response":
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> "requests.Response":
+    return request("POST", url, **kwargs)
+
+def put(url: str, **kwargs) -> "requests.Response":
+    return request("PUT", url, **kwargs)
+
+def patch(url: str, **kwargs) -> "requests.Response":
+    return request("PATCH", url, **kwargs)
+
+def get_json(url: str, headers: dict = None, **kwargs) -> tuple[int, object, "requests.Response"]:
+    # GETs `url` and returns (status, parsed JSON or None, response).
+    # If an earlier response carried an ETag or Last-Modified, the request is sent conditionally
+    #   and a 304 returns the earlier parsed object (with status 200) without downloading or parsing it again.
+    # The returned object may be shared between callers, so it must not be modified.
+    headers = dict(headers or {})
+    with _conditional_lock:
+        cached = _conditional_cache.get(url)
+        conditional_stats["requests"] += 1
+    if cached:
+        if cached[0]:
+            headers["if-none-match"] = cached[0]
+        if cached[1]:
+            headers["if-modified-since"] = cached[1]
+
+    response = get(url, headers=headers, **kwargs)
+    if response.status_code == 304 and cached:
+        with _conditional_lock:
+            conditional_stats["not_modified"] += 1
+            conditional_stats["bytes_saved"] += cached[3]
+            conditional_stats["parses_saved"] += 1
+        return 200, cached[2], response
+    if response.status_code != 200:
+        return response.status_code, None, response
+
+    with profiler.phase("parse"):
+        data = response.json()
+    etag, last_modified = response.headers.get("etag"), response.headers.get("last-modified")
+    with _conditional_lock:
+        if etag or last_modified:
+            _conditional_cache[url] = (etag, last_modified, data, len(response.content))
+        else:
+            _conditional_cache.pop(url, None)
+    return 200, data, response
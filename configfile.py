@@ -0,0 +1,208 @@
+import json, os, copy, threading, atexit
+
+# The single owner of config.json. Every module reads and changes the same in-memory dict (`load()`),
+#   so a change made anywhere (an account added in the menu, a reload in the saver...) is seen everywhere.
+# `save()` only marks the config for writing: unchanged configs aren't written at all, and saves in quick
+#   succession are coalesced into one write. Writes go through a temporary file that's fsynced and renamed
+#   over config.json, so the file is never left truncated, and they hold an advisory lock (config.json.lock)
+#   that DuoKLI, the saver and the updater all take, so a reader never sees another process mid-write.
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_CONFIG = {
+    "accounts": [],
+    "delay": 900,
+    "profile_cache_ttl": 300,
+    "debug": False
+}
+
+SAVE_DELAY = 0.5   # seconds a save waits for more changes before writing
+
+class FileLock:
+    # Advisory lock on a separate lock file (config.json itself is replaced on every write, so it can't be locked)
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.Lock()
+        self.fd = None
+
+    def __enter__(self):
+        self.local.acquire()
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.name == "nt":
+                import msvcrt
+                while True:
+                    try:
+                        msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after 10 seconds
+                        pass
+            else:
+                import fcntl
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+        except BaseException:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            self.local.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+            os.close(self.fd)
+        finally:
+            self.fd = None
+            self.local.release()
+
+class ConfigStore:
+    def __init__(self, path: str = CONFIG_FILE, save_delay: float = SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.lock = FileLock(path + ".lock")
+        self.data: dict | None = None
+        self.saved = None      # the config as last read from or written to disk, to tell whether it changed
+        self.mtime = None      # config.json's mtime after that read/write, to tell whether someone else changed it
+        # Copies of the config are taken on the thread that changed it (in `save`), under `state_lock`, and written
+        #   by the debounce timer. Writes run one at a time under `write_lock`; every copy is numbered, so an older
+        #   copy is never written over a newer one.
+        self.state_lock = threading.Lock()   # guards saved, pending, generation and timer
+        self.write_lock = threading.Lock()
+        self.timer: threading.Timer | None = None
+        self.pending: tuple[int, dict] | None = None   # the copy waiting for the timer
+        self.generation = 0    # number of the latest copy
+        self.written = 0       # number of the latest copy written
+
+    def stat(self) -> int | None:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def read(self) -> dict:
+        with self.lock:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.mtime = self.stat()
+        return data
+
+    def load(self) -> dict:
+        if self.data is None:
+            if not os.path.exists(self.path):
+                self.data = copy.deepcopy(DEFAULT_CONFIG)
+                self.flush()
+            else:
+                self.data = self.read()
+                self.saved = copy.deepcopy(self.data)
+        return self.data
+
+    @property
+    def dirty(self) -> bool:
+        return self.data is not None and self.data != self.saved
+
+    def snapshot(self) -> tuple[int, dict] | None:
+        # A numbered copy of the config to write, or None if it didn't change; called with `state_lock` held
+        if not self.dirty:
+            return None
+        self.generation += 1
+        return self.generation, copy.deepcopy(self.data)
+
+    def save(self):
+        # Writes the config if it changed, after `save_delay` seconds without another save
+        with self.state_lock:
+            snapshot = self.snapshot()
+            if snapshot is None:
+                return
+            if self.save_delay > 0:
+                self.pending = snapshot
+                if self.timer:
+                    self.timer.cancel()
+                self.timer = threading.Timer(self.save_delay, self.write_pending)
+                self.timer.daemon = True
+                self.timer.start()
+                return
+        self.write(snapshot)
+
+    def write_pending(self):
+        with self.state_lock:
+            snapshot, self.pending = self.pending, None
+            if self.timer is threading.current_thread():
+                self.timer = None
+        if snapshot:
+            self.write(snapshot)
+
+    def flush(self):
+        # Writes pending changes now (also called at exit, and by the updater before it restarts DuoKLI).
+        # A timer that already started writing is waited for, so its older copy can't land after this one.
+        with self.state_lock:
+            timer, self.timer = self.timer, None
+            self.pending = None
+        if timer:
+            timer.cancel()
+            if timer is not threading.current_thread():
+                timer.join()
+        with self.state_lock:
+            snapshot = self.snapshot()
+        if snapshot:
+            self.write(snapshot)
+
+    def write(self, snapshot: tuple[int, dict]):
+        generation, data = snapshot
+        with self.write_lock:
+            if generation <= self.written:
+                return
+            tmp = self.path + ".tmp"
+            with self.lock:
+                with open(tmp, "w") as f:
+                    json.dump(data, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                if os.name != "nt":
+                    # Makes the rename itself durable
+                    dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+                    try:
+                        os.fsync(dir_fd)
+                    finally:
+                        os.close(dir_fd)
+                self.mtime = self.stat()
+            self.written = generation
+            with self.state_lock:
+                self.saved = data
+
+    def poll(self) -> dict | None:
+        # Returns the config on disk if another process changed it since it was last read or written.
+        # A file that doesn't parse is retried on the next poll.
+        mtime = self.stat()
+        if mtime is None or mtime == self.mtime:
+            return None
+        try:
+            return self.read()
+        except (OSError, ValueError):
+            return None
+
+    def replace(self, new_config: dict):
+        # Adopts a config read from disk; updated in place, so every module keeps seeing the same object
+        self.load()
+        with self.state_lock:
+            self.data.clear()
+            self.data.update(new_config)
+            self.saved = copy.deepcopy(new_config)
+
+store = ConfigStore()
+
+def load() -> dict:
+    return store.load()
+
+def save():
+    store.save()
+
+def flush():
+    store.flush()
+
+atexit.register(flush)
@@ -0,0 +1,130 @@
+import json, os, threading, time, uuid, atexit
+
+# Progress journal for farm tasks, so a task cut short (crash, network drop, closed terminal, Ctrl+C...)
+#   can be resumed exactly where it stopped instead of starting over.
+#
+# An append-only JSONL file; every line is the full state of one task at that point:
+#   {"event": "start" | "progress" | "end", "task": "<id>", "t": ..., "type": "xp", "user_id": ...,
+#    "target": ..., "done": ..., "state": {...}}
+# `state` holds whatever else a farm needs to continue without asking the API again
+#   (e.g. the languages, or the streak start date and the last simulated day).
+# A task without an "end" line is unfinished. Finished tasks (and unfinished ones older than KEEP_DAYS)
+#   are dropped when the journal is loaded, and whenever the file grows past COMPACT_LINES.
+# The file stays open while the journal is in use. Progress is written at most every CHECKPOINT_INTERVAL seconds
+#   per task; the latest one is always written on `flush` (and at exit), so a stopped task resumes from its last count.
+
+JOURNAL_FILE = "task_journal.jsonl"
+KEEP_DAYS = 7
+CHECKPOINT_INTERVAL = 1.0
+COMPACT_LINES = 1000
+
+class TaskJournal:
+    def __init__(self, path: str = JOURNAL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        # task id -> latest entry, for unfinished tasks only
+        self.tasks: dict[str, dict] = {}
+        # task id -> progress entry not written yet, and when each task's last line was written
+        self.pending: dict[str, dict] = {}
+        self.written: dict[str, float] = {}
+        self.file = None
+        self.lines = 0
+        self.load()
+        atexit.register(self.close)
+
+    def load(self):
+        cutoff = time.time() - KEEP_DAYS * 86400
+        lines = 0
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut off by a crash; the task's previous checkpoint still counts
+                        continue
+                    if entry.get("event") == "end":
+                        self.tasks.pop(entry["task"], None)
+                    else:
+                        self.tasks[entry["task"]] = entry
+        except FileNotFoundError:
+            return
+        self.tasks = {task_id: entry for task_id, entry in self.tasks.items() if entry["t"] >= cutoff}
+        self.lines = lines
+        if lines > len(self.tasks):
+            self._compact()
+
+    def _compact(self):
+        # Rewrites the file with one line per unfinished task; a crash here leaves the previous file in place
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.writelines(json.dumps(entry, separators=(",", ":")) + "\n" for entry in self.tasks.values())
+        os.replace(tmp, self.path)
+        self.lines = len(self.tasks)
+        # Every task's latest entry is in the file now
+        self.pending.clear()
+
+    def _append(self, entry: dict):
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.written[entry["task"]] = time.monotonic()
+        self.lines += 1
+        if self.lines >= max(COMPACT_LINES, 2 * len(self.tasks)):
+            self._compact()
+
+    def _write(self, event: str, task_id: str, force: bool = True, **values) -> dict:
+        with self.lock:
+            entry = {**self.tasks.get(task_id, {}), **values, "event": event, "task": task_id, "t": round(time.time(), 1)}
+            self.pending.pop(task_id, None)
+            if event == "end":
+                self.tasks.pop(task_id, None)
+                self.written.pop(task_id, None)
+            else:
+                self.tasks[task_id] = entry
+            if force or time.monotonic() - self.written.get(task_id, 0) >= CHECKPOINT_INTERVAL:
+                self._append(entry)
+            else:
+                self.pending[task_id] = entry
+        return entry
+
+    def start(self, type: str, user_id: int, target: int, **state) -> str:
+        task_id = uuid.uuid4().hex[:12]
+        self._write("start", task_id, type=type, user_id=user_id, target=target, done=0, state=state)
+        return task_id
+
+    def checkpoint(self, task_id: str, done: int, **state):
+        if task_id not in self.tasks:
+            return
+        self._write("progress", task_id, force=False, done=done, state={**self.tasks[task_id]["state"], **state})
+
+    def finish(self, task_id: str, done: int):
+        if task_id in self.tasks:
+            self._write("end", task_id, done=done)
+
+    def discard(self, task_id: str):
+        if task_id in self.tasks:
+            self._write("end", task_id)
+
+    def flush(self):
+        # Writes the progress that was held back by CHECKPOINT_INTERVAL
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            for entry in pending.values():
+                self._append(entry)
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def unfinished(self, user_id: int) -> list[dict]:
+        with self.lock:
+            return sorted((entry for entry in self.tasks.values() if entry["user_id"] == user_id), key=lambda entry: entry["t"], reverse=True)
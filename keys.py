@@ -0,0 +1,111 @@
+import os, sys, time, queue, threading, atexit, _thread
+
+# Keyboard input, read by a single background thread into a queue of key events.
+# On POSIX the terminal is switched to cbreak mode once (no echo, no line buffering, but Ctrl+C still
+#   raises KeyboardInterrupt) and restored at exit, instead of toggling raw mode around every keystroke.
+# On Windows the thread reads with msvcrt.getwch.
+# Enter is always reported as "\r" and Backspace as "\177", like the old raw-mode getch did.
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import termios, tty
+
+_keys: queue.Queue[str | None] = queue.Queue()
+_thread_started = False
+_lock = threading.Lock()
+_saved_settings = None
+
+def _read_posix():
+    fd = sys.stdin.fileno()
+    while True:
+        data = os.read(fd, 32)
+        if not data:
+            _keys.put(None)
+            return
+        for ch in data.decode("utf-8", errors="ignore"):
+            _keys.put("\r" if ch == "\n" else "\177" if ch == "\b" else ch)
+
+def _read_windows():
+    while True:
+        ch = msvcrt.getwch()
+        if ch in ("\x00", "\xe0"):
+            # Arrow and function keys come as two characters; they aren't used anywhere
+            msvcrt.getwch()
+            continue
+        if ch == "\x03":
+            _thread.interrupt_main()
+            continue
+        _keys.put("\177" if ch == "\b" else ch)
+
+def start():
+    global _thread_started, _saved_settings
+    with _lock:
+        if _thread_started:
+            return
+        _thread_started = True
+        if os.name == "nt":
+            target = _read_windows
+        else:
+            if sys.stdin.isatty():
+                fd = sys.stdin.fileno()
+                _saved_settings = termios.tcgetattr(fd)
+                tty.setcbreak(fd)
+                atexit.register(restore)
+            target = _read_posix
+        threading.Thread(target=target, name="key-reader", daemon=True).start()
+
+def restore():
+    # Puts the terminal back the way it was, e.g. before exiting or replacing the process
+    if _saved_settings is not None:
+        termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, _saved_settings)
+
+def get(timeout: float | None = None) -> str | None:
+    # Next key, waiting up to `timeout` seconds (forever if None); None if the timeout passed
+    start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+        if wait <= 0:
+            return None
+        try:
+            # Short waits so Ctrl+C is handled promptly on platforms where blocking waits can't be interrupted
+            key = _keys.get(timeout=wait)
+        except queue.Empty:
+            continue
+        if key is None:
+            _keys.put(None)
+            raise EOFError("stdin was closed")
+        return key
+
+def poll() -> str | None:
+    # Next key if one was already pressed, without waiting
+    start()
+    try:
+        key = _keys.get_nowait()
+    except queue.Empty:
+        return None
+    if key is None:
+        _keys.put(None)
+        return None
+    return key
+
+def readline(prompt: str = "") -> str:
+    # Plain line input with echo, for code that would otherwise call input() and compete with the reader thread
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = []
+    while True:
+        key = get()
+        if key == "\r":
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+            return "".join(line)
+        if key == "\177":
+            if line:
+                line.pop()
+                sys.stdout.write("\b \b")
+        else:
+            line.append(key)
+            sys.stdout.write(key)
+        sys.stdout.flush()
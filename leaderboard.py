@@ -0,0 +1,78 @@
+from bisect import bisect_right, insort
+from datetime import datetime
+
+# Read-only view of one leaderboard fetch, indexed once so the saver can ask
+#   "what's my rank", "what's the score at position N" and "how much XP do I need" without rescanning.
+
+class LeaderboardSnapshot:
+    def __init__(self, rankings: list[dict], contest_end: float | None = None):
+        # `rankings` is in leaderboard order (the server breaks score ties), so positions come from list order
+        self.rankings = rankings
+        self.contest_end = contest_end
+        self.index = {user['user_id']: i for i, user in enumerate(rankings)}
+        self.scores = sorted(user['score'] for user in rankings)
+
+    @classmethod
+    def from_response(cls, data: dict) -> "LeaderboardSnapshot | None":
+        # Returns None when the user isn't in an active cohort
+        active = (data or {}).get('active')
+        if not active or 'cohort' not in active:
+            return None
+        end = (active.get('contest') or {}).get('contest_end')
+        try:
+            end = datetime.fromisoformat(end.replace("Z", "+00:00")).timestamp() if end else None
+        except ValueError:
+            end = None
+        return cls(active['cohort'].get('rankings', []), end)
+
+    def __len__(self):
+        return len(self.rankings)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.index
+
+    def user(self, user_id: int) -> dict | None:
+        i = self.index.get(user_id)
+        return self.rankings[i] if i is not None else None
+
+    def rank(self, user_id: int) -> int | None:
+        i = self.index.get(user_id)
+        return i + 1 if i is not None else None
+
+    def score(self, user_id: int) -> int | None:
+        user = self.user(user_id)
+        return user['score'] if user else None
+
+    def at(self, position: int) -> dict | None:
+        return self.rankings[position - 1] if 1 <= position <= len(self.rankings) else None
+
+    def score_at(self, position: int) -> int | None:
+        user = self.at(position)
+        return user['score'] if user else None
+
+    def rank_for_score(self, score: int) -> int:
+        # Position a user with `score` would hold (ties rank below existing users)
+        return len(self.scores) - bisect_right(self.scores, score) + 1
+
+    def xp_needed(self, user_id: int, position: int, margin: int = 0) -> int:
+        # XP `user_id` has to gain to pass whoever holds `position` by `margin`; 0 if already there
+        rank, target = self.rank(user_id), self.at(position)
+        if rank is None or target is None or rank <= position:
+            return 0
+        return max(0, target['score'] - self.score(user_id) + margin)
+
+    def with_score(self, user_id: int, score: int) -> "LeaderboardSnapshot":
+        # A copy with one user's score changed and the order updated, without refetching the leaderboard
+        user = {**self.user(user_id), 'score': score}
+        others = [u for u in self.rankings if u['user_id'] != user_id]
+        scores = [-u['score'] for u in others]
+        # Other users stay ahead on ties, like rank_for_score assumes
+        at = bisect_right(scores, -score)
+        snapshot = LeaderboardSnapshot.__new__(LeaderboardSnapshot)
+        snapshot.rankings = others[:at] + [user] + others[at:]
+        snapshot.contest_end = self.contest_end
+        snapshot.index = {u['user_id']: i for i, u in enumerate(snapshot.rankings)}
+        snapshot.scores = list(self.scores)
+        snapshot.scores.remove(self.score(user_id))
+        insort(snapshot.scores, score)
+        return snapshot
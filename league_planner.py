@@ -0,0 +1,171 @@
+import json, os, sys, threading, time
+from datetime import datetime
+from leaderboard import LeaderboardSnapshot
+
+# Predictive league saving. Only the standings at the end of a contest count, so instead of farming every time
+#   someone passes the user, the saver records cohort scores over the week, estimates how fast each competitor
+#   gains XP, and tops up once, close to the end, by the amount projected to hold the target position.
+#   Only a gap too large to leave for the top-up is closed as soon as it's seen.
+#
+# The history is an append-only JSONL file with two kinds of lines:
+#   {"type": "sample", "t": ..., "user_id": ..., "contest_end": ..., "scores": {"<user id>": score, ...}}
+#   {"type": "decision", "t": ..., "user_id": ..., "contest_end": ..., "position": ..., "xp": ..., ...}
+#
+# `python league_planner.py [history file]` prints the recorded contests and decisions for offline inspection.
+
+HISTORY_FILE = "league_history.jsonl"
+KEEP_DAYS = 28          # samples of contests that ended longer ago than this are dropped on load
+MIN_RATE_SPAN = 3600    # two samples have to be at least this far apart (in seconds) to estimate a rate
+
+class Plan:
+    def __init__(self, xp: int, target_user: int | None, target_projected: float, my_score: int, rates: dict[int, float]):
+        self.xp = xp
+        self.target_user = target_user
+        self.target_projected = target_projected
+        self.my_score = my_score
+        self.rates = rates
+
+def estimate_rate(samples: list[tuple[float, int]]) -> float | None:
+    # Least-squares slope of score over time, in XP per second
+    if len(samples) < 2 or samples[-1][0] - samples[0][0] < MIN_RATE_SPAN:
+        return None
+    n = len(samples)
+    mean_t = sum(t for t, _ in samples) / n
+    mean_s = sum(s for _, s in samples) / n
+    var = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not var:
+        return None
+    return max(0.0, sum((t - mean_t) * (s - mean_s) for t, s in samples) / var)
+
+class LeaguePlanner:
+    def __init__(self, path: str = HISTORY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        # (user_id, contest_end) -> competitor id -> [(t, score), ...]
+        self.samples: dict[tuple[int, float], dict[int, list[tuple[float, int]]]] = {}
+        self.load()
+
+    def load(self):
+        cutoff = time.time() - KEEP_DAYS * 86400
+        kept, dropped = [], False
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        dropped = True
+                        continue
+                    if (entry.get("contest_end") or 0) < cutoff:
+                        dropped = True
+                        continue
+                    kept.append(line if line.endswith("\n") else line + "\n")
+                    if entry.get("type") == "sample":
+                        self._add(entry)
+        except FileNotFoundError:
+            return
+        if dropped:
+            # Rewrite without old contests; a crash here leaves the previous file in place
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                f.writelines(kept)
+            os.replace(tmp, self.path)
+
+    def _add(self, entry: dict):
+        cohort = self.samples.setdefault((entry["user_id"], entry["contest_end"]), {})
+        for uid, score in entry["scores"].items():
+            cohort.setdefault(int(uid), []).append((entry["t"], score))
+
+    def _append(self, entry: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def record(self, user_id: int, snapshot: LeaderboardSnapshot):
+        if snapshot.contest_end is None:
+            return
+        entry = {
+            "type": "sample",
+            "t": round(time.time(), 1),
+            "user_id": user_id,
+            "contest_end": snapshot.contest_end,
+            "scores": {str(u['user_id']): u['score'] for u in snapshot.rankings},
+        }
+        with self.lock:
+            self._add(entry)
+            self._append(entry)
+
+    def record_decision(self, user_id: int, snapshot: LeaderboardSnapshot, position: int, xp: int, plan: Plan | None):
+        entry = {
+            "type": "decision",
+            "t": round(time.time(), 1),
+            "user_id": user_id,
+            "contest_end": snapshot.contest_end,
+            "position": position,
+            "rank": snapshot.rank(user_id),
+            "score": snapshot.score(user_id),
+            "xp": xp,
+        }
+        if plan:
+            entry.update(target_user=plan.target_user, target_projected=round(plan.target_projected))
+        with self.lock:
+            self._append(entry)
+
+    def plan(self, user_id: int, snapshot: LeaderboardSnapshot, position: int, margin: int = 60) -> Plan | None:
+        # How much XP `user_id` has to gain now to still hold `position` when the contest ends
+        end = snapshot.contest_end
+        my_score = snapshot.score(user_id)
+        if end is None or my_score is None:
+            return None
+        now = time.time()
+        with self.lock:
+            history = self.samples.get((user_id, end), {})
+            rates = {uid: estimate_rate(points) for uid, points in history.items() if uid != user_id}
+        known = sorted(r for r in rates.values() if r is not None)
+        # Competitors without enough history are assumed to move at the cohort's median rate
+        fallback = known[len(known) // 2] if known else 0.0
+
+        remaining = max(0.0, end - now)
+        projected = []
+        for user in snapshot.rankings:
+            if user['user_id'] == user_id:
+                continue
+            rate = rates.get(user['user_id'])
+            projected.append((user['score'] + (rate if rate is not None else fallback) * remaining, user['user_id']))
+        projected.sort(reverse=True)
+        if len(projected) < position:
+            return Plan(0, None, 0.0, my_score, rates)
+
+        target_projected, target_user = projected[position - 1]
+        # The further out the projection, the less it can be trusted; widen the margin accordingly
+        uncertainty = 0.1 * (target_projected - snapshot.score(target_user))
+        xp = max(0, int(target_projected + margin + uncertainty) - my_score + 1)
+        return Plan(xp, target_user, target_projected, my_score, rates)
+
+def describe(path: str = HISTORY_FILE):
+    contests: dict[tuple[int, float], dict] = {}
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            contest = contests.setdefault((entry["user_id"], entry["contest_end"]), {"samples": [], "decisions": []})
+            contest["samples" if entry["type"] == "sample" else "decisions"].append(entry)
+
+    for (user_id, end), contest in sorted(contests.items(), key=lambda x: x[0][1]):
+        print(f"User {user_id}, contest ending {datetime.fromtimestamp(end):%Y-%m-%d %H:%M}: "
+              f"{len(contest['samples'])} samples, {len(contest['decisions'])} decisions")
+        points: dict[int, list[tuple[float, int]]] = {}
+        for s in contest["samples"]:
+            for uid, score in s["scores"].items():
+                points.setdefault(int(uid), []).append((s["t"], score))
+        rates = sorted((((estimate_rate(p) or 0.0) * 3600, p[-1][1], uid) for uid, p in points.items()), reverse=True)
+        for rate, _, uid in rates[:5]:
+            print(f"  {'*' if uid == user_id else ' '} {uid}: {rate:,.1f} XP/h, last score {points[uid][-1][1]:,}")
+        for d in contest["decisions"]:
+            target = f", target {d['target_user']} projected at {d['target_projected']:,}" if "target_user" in d else ""
+            print(f"    {datetime.fromtimestamp(d['t']):%Y-%m-%d %H:%M} rank {d['rank']} (score {d['score']:,}) "
+                  f"-> farm {d['xp']:,} XP for position {d['position']}{target}")
+
+if __name__ == "__main__":
+    describe(sys.argv[1] if len(sys.argv) > 1 else HISTORY_FILE)
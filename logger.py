@@ -0,0 +1,123 @@
+import logging, queue, atexit, threading, time
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import logging.handlers
+
+# Debug log sink. Callers only put records on a queue; formatting, truncation, sampling
+#   and writing to the rotating log file all happen on a background thread.
+# logging.handlers is only imported when the first record is logged, since most runs never log anything.
+
+DEFAULTS = {
+    "log_file": "duokli.log",
+    "log_max_bytes": 1_000_000,
+    "log_backup_count": 3,
+    "log_body_limit": 500,
+    "log_sample_burst": 20,
+    "log_sample_window": 60,
+}
+
+log = logging.getLogger("duokli")
+log.setLevel(logging.DEBUG)
+log.propagate = False
+
+_settings = dict(DEFAULTS)
+_listener: "logging.handlers.QueueListener | None" = None
+_lock = threading.Lock()
+
+class Body:
+    # Defers reading (and decoding) a response body until the writer thread formats the record
+    def __init__(self, response):
+        self.response = response
+
+    def __str__(self):
+        return self.response.text
+
+class _TruncateFilter(logging.Filter):
+    def filter(self, record):
+        limit = _settings["log_body_limit"]
+        if record.args:
+            args = []
+            for arg in record.args:
+                s = str(arg) if isinstance(arg, (str, Body)) else arg
+                if isinstance(s, str) and len(s) > limit:
+                    s = f"{s[:limit]}... [{len(s) - limit:,} more characters]"
+                args.append(s)
+            record.args = tuple(args)
+        return True
+
+class _SampleFilter(logging.Filter):
+    # Lets the first `log_sample_burst` records with the same message template (and first argument)
+    #   through per `log_sample_window` seconds, then only counts them until the window ends.
+    def __init__(self):
+        super().__init__()
+        self.windows: dict[tuple, list] = {}
+
+    def filter(self, record):
+        key = (record.msg, str(record.args[0]) if record.args else None)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= _settings["log_sample_window"]:
+            suppressed = window[2] if window else 0
+            self.windows[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"(suppressed {suppressed:,} similar messages) {record.msg}"
+            return True
+        window[1] += 1
+        if window[1] <= _settings["log_sample_burst"]:
+            return True
+        window[2] += 1
+        return False
+
+def configure(config: dict):
+    # Applies the log_* settings from config.json; the file handler is (re)created on the next start
+    with _lock:
+        changed_file = any(config.get(k, DEFAULTS[k]) != _settings[k] for k in ("log_file", "log_max_bytes", "log_backup_count"))
+        _settings.update({k: config.get(k, v) for k, v in DEFAULTS.items()})
+    if changed_file and _listener:
+        shutdown()
+
+def start():
+    global _listener
+    with _lock:
+        if _listener:
+            return
+        import logging.handlers
+
+        class QueueHandler(logging.handlers.QueueHandler):
+            def prepare(self, record):
+                # The default implementation formats the message on the calling thread; leave that to the writer
+                return record
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            _settings["log_file"], maxBytes=_settings["log_max_bytes"], backupCount=_settings["log_backup_count"], encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(message)s"))
+        file_handler.addFilter(_SampleFilter())
+        file_handler.addFilter(_TruncateFilter())
+
+        q = queue.SimpleQueue()
+        log.handlers.clear()
+        log.addHandler(QueueHandler(q))
+        _listener = logging.handlers.QueueListener(q, file_handler, respect_handler_level=False)
+        _listener.start()
+
+def shutdown():
+    global _listener
+    with _lock:
+        if not _listener:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        log.handlers.clear()
+
+def log_path() -> str:
+    return _settings["log_file"]
+
+def debug(msg: str, *args):
+    if not _listener:
+        start()
+    log.debug(msg, *args)
+
+atexit.register(shutdown)
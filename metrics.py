@@ -0,0 +1,150 @@
+import json, re, threading, time
+from urllib.parse import urlsplit
+
+# Upper bounds (in seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+_ID_SEGMENT = re.compile(r"^\d+$")
+_UUID_SEGMENT = re.compile(r"^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$|^[0-9a-fA-F]{24,}$")
+
+def endpoint_name(method: str, url: str) -> str:
+    # Collapses user ids, session ids and leaderboard ids, so every call to the same endpoint shares one entry
+    parts = urlsplit(url)
+    segments = []
+    for seg in parts.path.split("/"):
+        if _ID_SEGMENT.match(seg):
+            seg = "{id}"
+        elif _UUID_SEGMENT.match(seg):
+            seg = "{uuid}"
+        segments.append(seg)
+    return f"{method.upper()} {parts.hostname}{'/'.join(segments)}"
+
+class EndpointMetrics:
+    def __init__(self):
+        self.count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.statuses: dict[str, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+
+    def observe(self, status: int | None, elapsed: float, bytes_in: int, bytes_out: int):
+        self.count += 1
+        self.latency_sum += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+                break
+        key = str(status) if status is not None else "error"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def percentile(self, q: float) -> float:
+        # Estimated from the histogram: the upper bound of the bucket the q-th request falls into
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "latency_sum": round(self.latency_sum, 6),
+            "latency_max": round(self.latency_max, 6),
+            "latency_buckets": {str(b): n for b, n in zip(LATENCY_BUCKETS, self.buckets)},
+            "statuses": dict(self.statuses),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "retries": self.retries,
+        }
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints: dict[str, EndpointMetrics] = {}
+            self.started = time.time()
+
+    def _get(self, endpoint: str) -> EndpointMetrics:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointMetrics()
+        return self.endpoints[endpoint]
+
+    def record(self, endpoint: str, status: int | None, elapsed: float, bytes_in: int = 0, bytes_out: int = 0):
+        with self.lock:
+            self._get(endpoint).observe(status, elapsed, bytes_in, bytes_out)
+
+    def record_retry(self, endpoint: str):
+        with self.lock:
+            self._get(endpoint).retries += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "started": self.started,
+                "taken": time.time(),
+                "endpoints": {name: m.to_dict() for name, m in self.endpoints.items()},
+            }
+
+    def summary(self) -> list[str]:
+        with self.lock:
+            items = sorted(self.endpoints.items(), key=lambda x: x[1].latency_sum, reverse=True)
+            lines = []
+            for name, m in items:
+                statuses = ", ".join(f"{s}×{n}" for s, n in sorted(m.statuses.items()))
+                lines.append(
+                    f"{name}: {m.count:,} req, avg {m.latency_sum / m.count * 1000 if m.count else 0:.0f} ms, "
+                    f"p95 ≤{m.percentile(0.95) * 1000:.0f} ms, max {m.latency_max * 1000:.0f} ms, "
+                    f"{m.bytes_in / 1024:,.1f} KiB in, {m.bytes_out / 1024:,.1f} KiB out, "
+                    f"{m.retries:,} retries [{statuses}]"
+                )
+            return lines
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        out = [
+            "# HELP duokli_request_duration_seconds Latency of requests to Duolingo per endpoint.",
+            "# TYPE duokli_request_duration_seconds histogram",
+        ]
+        for name, m in snap["endpoints"].items():
+            label = f'endpoint="{name}"'
+            cumulative = 0
+            for bound, n in m["latency_buckets"].items():
+                cumulative += n
+                le = "+Inf" if bound == "inf" else bound
+                out.append(f'duokli_request_duration_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            out.append(f"duokli_request_duration_seconds_sum{{{label}}} {m['latency_sum']}")
+            out.append(f"duokli_request_duration_seconds_count{{{label}}} {m['count']}")
+        for metric, key, help_text in [
+            ("duokli_response_bytes_total", "bytes_in", "Bytes received from Duolingo per endpoint."),
+            ("duokli_request_bytes_total", "bytes_out", "Bytes sent to Duolingo per endpoint."),
+            ("duokli_request_retries_total", "retries", "Requests repeated after a failure per endpoint."),
+        ]:
+            out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            out += [f'{metric}{{endpoint="{name}"}} {m[key]}' for name, m in snap["endpoints"].items()]
+        out += ["# HELP duokli_responses_total Responses per endpoint and status code.", "# TYPE duokli_responses_total counter"]
+        for name, m in snap["endpoints"].items():
+            out += [f'duokli_responses_total{{endpoint="{name}",status="{s}"}} {n}' for s, n in m["statuses"].items()]
+        return "\n".join(out) + "\n"
+
+    def write_snapshot(self, path: str):
+        # `.prom`/`.txt` files get the Prometheus text format, anything else is written as JSON
+        if path.endswith((".prom", ".txt")):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=4)
+        with open(path, "w") as f:
+            f.write(data)
+
+registry = MetricsRegistry()
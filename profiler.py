@@ -0,0 +1,147 @@
+import os, sys, time, threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Profiling mode (`--profile` or the "Profiling" setting). A task started from the menu, or a saver run, becomes a
+#   profiling session that collects:
+#   - per-phase timers (payload build, request, response parse, progress update...) from every thread
+#   - cProfile data from the thread that runs the task and from any thread wrapped in `thread_profile`
+#   - tracemalloc allocation sites and peak memory
+# and writes them to a report file in `profile_dir`; `session` returns a short top-N summary for the screen.
+# cProfile, pstats and tracemalloc are only imported when a session starts.
+# When profiling is off, every hook here is a no-op.
+
+PROFILE_DIR = "profiles"
+REPORT_FUNCTIONS = 40   # functions listed in the report file
+REPORT_ALLOCATIONS = 20 # allocation sites listed in the report file
+
+enabled = "--profile" in sys.argv
+
+_lock = threading.Lock()
+_active = False
+_phases: dict[str, list[float]] = {}   # name -> [count, total seconds]
+_profiles: list = []
+
+def configure(config: dict):
+    global enabled
+    enabled = "--profile" in sys.argv or config.get('profile', False)
+
+def record(name: str, seconds: float):
+    if not _active:
+        return
+    with _lock:
+        phase = _phases.setdefault(name, [0, 0.0])
+        phase[0] += 1
+        phase[1] += seconds
+
+@contextmanager
+def _timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def phase(name: str):
+    # `with profiler.phase("parse"): ...` times a block as one phase
+    return _timed(name) if _active else nullcontext()
+
+class Laps:
+    # Times consecutive steps of a loop without wrapping each one in a `with` block:
+    #   `laps.mark("payload")` records the time since the previous mark as "payload";
+    #   `laps.skip()` restarts the clock without recording (for steps timed elsewhere, like requests)
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def mark(self, name: str):
+        if _active:
+            now = time.perf_counter()
+            record(name, now - self.last)
+            self.last = now
+
+    def skip(self):
+        if _active:
+            self.last = time.perf_counter()
+
+@contextmanager
+def _thread_profile():
+    import cProfile
+    profile = cProfile.Profile()
+    with _lock:
+        _profiles.append(profile)
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+
+def thread_profile():
+    # cProfile only sees the thread it was enabled in; worker threads wrap their work in this
+    return _thread_profile() if _active else nullcontext()
+
+@contextmanager
+def session(name: str, config: dict, summary: list):
+    # Profiles the block if profiling is enabled; afterwards `summary` holds the lines to print
+    global _active
+    if not enabled or _active:
+        yield
+        return
+    import tracemalloc
+    with _lock:
+        _phases.clear()
+        _profiles.clear()
+    tracemalloc.start()
+    _active = True
+    start = time.perf_counter()
+    try:
+        with _thread_profile():
+            yield
+    finally:
+        _active = False
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        summary.extend(report(name, config, elapsed, snapshot, peak))
+
+def report(name: str, config: dict, elapsed: float, snapshot, peak: int) -> list[str]:
+    import io, pstats, tracemalloc
+    top = config.get('profile_top', 5)
+    stats = pstats.Stats(*_profiles, stream=io.StringIO())
+    stats.sort_stats("cumulative")
+    phases = sorted(_phases.items(), key=lambda x: x[1][1], reverse=True)
+    allocations = snapshot.filter_traces([
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        tracemalloc.Filter(False, __file__),
+    ]).statistics("lineno")
+
+    # Functions by cumulative time, without the profiler's own frames
+    functions = [(func, stat) for func, stat in sorted(stats.stats.items(), key=lambda x: x[1][3], reverse=True)
+                 if not func[0].endswith(("profiler.py", "contextlib.py")) and func[2] not in ("<built-in method builtins.exec>",)]
+
+    def describe(func) -> str:
+        filename, line, function = func
+        return f"{function} ({os.path.basename(filename)}:{line})" if line else function
+
+    lines = [f"{name}: {elapsed:.2f}s wall, peak traced memory {peak / 1024 / 1024:,.1f} MiB"]
+    lines += ["", "Phases (count, total, mean, share of wall time):"]
+    lines += [f"  {phase:<12} {count:>8,} {total:>9.3f}s {total / count * 1000:>9.2f} ms {total / elapsed:>6.1%}"
+              for phase, (count, total) in phases] or ["  (none recorded)"]
+    lines += ["", "Functions by cumulative time (calls, own time, cumulative):"]
+    lines += [f"  {stat[1]:>9,} {stat[2]:>9.3f}s {stat[3]:>9.3f}s  {describe(func)}" for func, stat in functions[:REPORT_FUNCTIONS]]
+    lines += ["", "Allocations still held at the end (size, blocks):"]
+    lines += [f"  {stat.size / 1024:>9,.1f} KiB {stat.count:>8,}  {stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+              for stat in allocations[:REPORT_ALLOCATIONS]]
+
+    os.makedirs(config.get('profile_dir', PROFILE_DIR), exist_ok=True)
+    path = os.path.join(config.get('profile_dir', PROFILE_DIR), f"{name.replace(' ', '_').lower()}-{datetime.now():%Y%m%d-%H%M%S}.txt")
+    stats.stream = io.StringIO()
+    stats.print_stats(REPORT_FUNCTIONS)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n\n" + "cProfile output:\n" + stats.stream.getvalue())
+
+    summary = [lines[0], "Slowest phases: " + (", ".join(f"{phase} {total:.2f}s ({total / elapsed:.0%})" for phase, (_, total) in phases[:top]) or "none recorded")]
+    summary += ["Top functions by cumulative time:"]
+    summary += [f"  {stat[3]:>8.3f}s  {describe(func)}" for func, stat in functions[:top]]
+    summary += [f"Full report: {path}"]
+    return summary
@@ -1,23 +1,101 @@
-import json, pytz, sys, traceback, time, requests, random
+import pytz, sys, os, json, traceback, time, random, threading
+import utils
+import client, metrics, logger, breaker, configfile, profiler
+from scheduler import Scheduler
+from saver_state import SaverState
+from leaderboard import LeaderboardSnapshot
+from league_planner import LeaguePlanner, HISTORY_FILE
 _print = print
-from rich import print
-from tzlocal import get_localzone
-from datetime import datetime, timezone
-from utils import get_duo_info, get_headers, clear, current_time
+from rich.markup import escape
+from datetime import datetime, timezone, timedelta
+from typing import NamedTuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor, Future
+from utils import (get_duo_info, invalidate_duo_info, get_headers, clear, current_time, profile_cache_stats,
+                   local_timezone, DuoProfile, print, output_buffer, set_output_buffer, flush_output)
 
 VERSION = "v0.1.2 Beta"
-TIMEZONE = str(get_localzone())
-
-with open("config.json", "r") as f:
-    config: dict = json.load(f)
 
+# The shared config from configfile.load(); `run` is passed the same object
+config: dict = configfile.load()
 DEBUG = config['debug']
-title_string = f'\n   [bold][bright_green]Duo[/][bright_blue]KLI[/] [bright_green]Saver[/] [white]{VERSION}[/]{" [magenta][Debug Mode Enabled][/]" if DEBUG else ""}[/]'
 
-def farm_xp(account, amount):
+# Scheduling, in seconds
+MIN_INTERVAL = 60     # never check the same account/feature more often than this
+STREAK_MARGIN = 300   # check streaks this long after the account's local midnight
+IDLE_FACTOR = 4       # far from any deadline, league checks are up to `delay * IDLE_FACTOR` apart
+CONFIG_POLL_INTERVAL = 2   # how often config.json is checked for changes while waiting
+MAX_FARM_FAILURES = 10     # farm_xp gives up after this many failed requests in a row
+TOPUP_LEAD = 1800          # with the league planner, top up this long before the contest ends
+SAMPLE_INTERVAL = 6 * 3600 # and sample the cohort this often until then
+SAFETY_GAP = 1000          # but close a gap larger than this (in XP) right away instead of waiting for the top-up
+DEFAULT_WORKERS = 8        # accounts checked at the same time, unless `saver_workers` is set
+
+CONFIG_FILE = configfile.CONFIG_FILE
+
+STREAK_FIELDS = ("from_language", "learning_language", "streak_data", "timezone")
+
+# Accounts are checked on worker threads; whatever a check prints (here or in utils, including from the threads
+#   that fetch its snapshot) is buffered and printed in one piece when it finishes, so the output of accounts
+#   checked at the same time doesn't interleave (see utils.print)
+_stop = threading.Event()
+
+def title_string() -> str:
+    return f'\n   [bold][bright_green]Duo[/][bright_blue]KLI[/] [bright_green]Saver[/] [white]{VERSION}[/]{" [magenta][Debug Mode Enabled][/]" if DEBUG else ""}[/]'
+
+def write_metrics():
+    if config.get('metrics_file'):
+        try:
+            metrics.registry.write_snapshot(config['metrics_file'])
+        except OSError as e:
+            print(f"{current_time()} [red]Failed to write metrics to {config['metrics_file']}: {e}[/]")
+
+# The saver state, league planner and snapshot pool are created on first use, which can be on any worker thread
+_state = None
+_planner = None
+_init_lock = threading.Lock()
+
+def get_state() -> SaverState:
+    global _state
+    with _init_lock:
+        if _state is None:
+            _state = SaverState(config.get('saver_state_file', 'saver_state.db'))
+        return _state
+
+def get_planner() -> LeaguePlanner:
+    global _planner
+    with _init_lock:
+        if _planner is None:
+            _planner = LeaguePlanner(config.get('league_history_file', HISTORY_FILE))
+        return _planner
+
+def account_timezone(duo_info) -> pytz.BaseTzInfo:
+    try:
+        return pytz.timezone(duo_info.timezone) if duo_info and duo_info.timezone else pytz.timezone(local_timezone())
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(local_timezone())
+
+def next_midnight(tz: pytz.BaseTzInfo) -> float:
+    tomorrow = (datetime.now(tz) + timedelta(days=1)).date()
+    return tz.localize(datetime.combine(tomorrow, datetime.min.time())).timestamp()
+
+def retry_at(deadline: float | None = None) -> float:
+    # Failed checks are retried after `delay`, but more often as the deadline gets closer
+    now = time.time()
+    interval = config['delay'] if deadline is None else min(config['delay'], (deadline - now) / 4)
+    return now + max(MIN_INTERVAL, interval)
+
+def league_next_check(end: float | None) -> float:
+    # Sparse checks early in the week, converging on the end of the contest
+    now = time.time()
+    if end is None or end <= now:
+        return now + config['delay']
+    return now + max(MIN_INTERVAL, min((end - now) / 4, config['delay'] * IDLE_FACTOR))
+
+def farm_xp(account, amount) -> int:
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] Starting to farm {amount} XP for {config['accounts'][account]['username']}")
-        original_amount = amount
+    original_amount = amount
     token = config['accounts'][account]['token']
     headers = {
         "authorization": f"Bearer {token}",
@@ -33,6 +111,7 @@ def farm_xp(account, amount):
         "accept": "application/json"
     }
 
+    failed = 0
     while True:
         now_ts = int(datetime.now(timezone.utc).timestamp())
         duration = random.randint(300, 420)
@@ -57,65 +136,79 @@ def farm_xp(account, amount):
             "startTime": now_ts,
             "endTime": now_ts + duration,
         }
-        response = requests.post('https://stories.duolingo.com/api2/stories/fr-en-le-passeport/complete', headers=headers, json=dataget, timeout=10)
+        try:
+            response = client.post('https://stories.duolingo.com/api2/stories/fr-en-le-passeport/complete', headers=headers, json=dataget, retry=failed > 0)
+        except breaker.CircuitOpen as e:
+            print(f"{current_time()} [yellow]Rate limited while farming XP, stopping for now ({e.retry_in:.0f}s cool-down)[/]")
+            break
         if response.status_code == 200:
+            failed = 0
             response_data = response.json()
             amount -= response_data.get('awardedXp', 0)
             if DEBUG:
-                print(f"{current_time()} [bold magenta][DEBUG][/] Farmed {response_data.get('awardedXp', 0)} XP")
+                logger.debug("Farmed %s XP", response_data.get('awardedXp', 0))
         else:
+            failed += 1
             if DEBUG:
                 _print("\a", end="")
-                print(
-                    f"{current_time()} [bold magenta][DEBUG][/] Failed to farm {base_xp + happy_hour_bonus} XP\n"
-                    f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                    f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                )
+                logger.debug("Failed to farm %s XP", base_xp + happy_hour_bonus)
+            if failed >= MAX_FARM_FAILURES:
+                print(f"{current_time()} [red]Failed to farm XP {failed} times in a row, stopping for now[/]")
+                break
 
-        if amount <= 0:
+        if amount <= 0 or _stop.is_set():
             break
 
+    invalidate_duo_info(account)
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] Finished farming {original_amount - amount} XP for {config['accounts'][account]['username']}")
+    return original_amount - amount
+
+def leaderboard_url(duo_id: int) -> str:
+    # No cache-busting parameter: the URL stays stable so unchanged leaderboards can be answered with a 304
+    return (f"https://duolingo-leaderboards-prod.duolingo.com/leaderboards/7d9f5dd1-8423-491a-91f2-2532052038ce/users/{duo_id}"
+            f"?client_unlocked=true&get_reactions=true")
+
+def fetch_leaderboard(account) -> tuple[int, dict | None]:
+    status, leaderboard_data, _ = client.get_json(leaderboard_url(int(config['accounts'][account]['id'])), headers=get_headers(account))
+    return status, leaderboard_data
+
+def fetch_private(account) -> bool | None:
+    # Whether the profile is private (which keeps it out of leaderboards), or None if the request failed
+    duo_id = int(config['accounts'][account]['id'])
+    response = client.get(f"https://www.duolingo.com/2017-06-30/users/{duo_id}/privacy-settings", headers=get_headers(account))
+    if response.status_code != 200:
+        return None
+    privacy_settings = response.json().get('privacySettings', [])
+    social_setting = next((setting for setting in privacy_settings if setting['id'] == 'disable_social'), None)
+    return social_setting['enabled'] if social_setting else False
 
-def leaderboard_registration(account):
+def leaderboard_registration(account, was_private: bool | None = None):
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] Attempting to enter a leaderboard for {config['accounts'][account]['username']}")
     duo_id = int(config['accounts'][account]['id'])
     headers = get_headers(account)
 
-    url = f"https://www.duolingo.com/2017-06-30/users/{duo_id}/privacy-settings"
-    response = requests.get(url, headers=headers, timeout=10)
-    if response.status_code != 200:
-        print(f"{current_time()} [red]Failed to get privacy settings.[/]")
+    if was_private is None:
+        was_private = fetch_private(account)
+        if was_private is None:
+            print(f"{current_time()} [red]Failed to get privacy settings.[/]")
+            if DEBUG:
+                _print("\a", end="")
+            return
         if DEBUG:
-            _print("\a", end="")
-            print(
-                f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-            )
-        return
-    if DEBUG:
-        print(f"{current_time()} [bold magenta][DEBUG][/] Fetched privacy settings")
-    data = response.json()
-    privacy_settings = data.get('privacySettings', [])
-    social_setting = next((setting for setting in privacy_settings if setting['id'] == 'disable_social'), None)
-    was_private = social_setting['enabled'] if social_setting else False
+            print(f"{current_time()} [bold magenta][DEBUG][/] Fetched privacy settings")
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] {was_private = }")
 
     if was_private:
         url = f"https://www.duolingo.com/2017-06-30/users/{duo_id}/privacy-settings?fields=privacySettings"
         payload = {"DISABLE_SOCIAL": False}
-        response = requests.patch(url, headers=headers, json=payload, timeout=10)
+        response = client.patch(url, headers=headers, json=payload)
         if response.status_code != 200:
             print(f"{current_time()} [red]Failed to set profile to public.[/]")
             if DEBUG:
                 _print("\a", end="")
-                print(
-                    f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                    f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                )
             return
         if DEBUG:
             print(f"{current_time()} [bold magenta][DEBUG][/] Set profile to public")
@@ -127,25 +220,115 @@ def leaderboard_registration(account):
     if was_private:
         url = f"https://www.duolingo.com/2017-06-30/users/{duo_id}/privacy-settings?fields=privacySettings"
         payload = {"DISABLE_SOCIAL": True}
-        response = requests.patch(url, headers=headers, json=payload, timeout=10)
+        response = client.patch(url, headers=headers, json=payload)
         if response.status_code != 200:
             print(f"{current_time()} [red]Failed to restore privacy settings.[/]")
             if DEBUG:
                 _print("\a", end="")
-                print(
-                    f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                    f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                )
             return
 
-def save_streak(account):
+class AccountSnapshot(NamedTuple):
+    # Everything the saver reads about an account for one check, fetched together by `fetch_snapshot`.
+    # A read that wasn't needed (or failed) is None
+    profile: DuoProfile | None = None
+    leaderboard_status: int | None = None
+    leaderboard: dict | None = None
+    private: bool | None = None
+
+_pool: "ThreadPoolExecutor | None" = None
+
+def get_pool() -> "ThreadPoolExecutor":
+    # Sized like the saver's own pool, so every account being checked can have its reads in flight
+    global _pool
+    with _init_lock:
+        if _pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _pool = ThreadPoolExecutor(max_workers=config.get('saver_workers', DEFAULT_WORKERS), thread_name_prefix="snapshot")
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _init_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def streak_verified(user_id: int) -> float | None:
+    # If today's streak was already verified, returns when to check it next (without any request)
+    known = get_state().get(user_id)
+    if known and known['streak_date'] and known['streak_tz'] in pytz.all_timezones_set:
+        known_tz = pytz.timezone(known['streak_tz'])
+        if known['streak_date'] == datetime.now(known_tz).date().isoformat():
+            return next_midnight(known_tz) + STREAK_MARGIN
+    return None
+
+def settled(account: int, feature: str) -> float | None:
+    # If the saver state proves a check isn't needed right now, returns when to check next; None if it has to run.
+    #   streak: already extended today (in the account's timezone)
+    #   league: the last check of the running contest found the target position held and planned the next check
+    #           for later (e.g. the account was rescheduled by a config reload that only loosened its target)
+    user_id = config['accounts'][account]['id']
+    if feature == "streak":
+        return streak_verified(user_id)
+    known = get_state().get(user_id)
+    now = time.time()
+    if known and known['league_rank'] is not None and (known['league_end'] or 0) > now \
+            and known['league_rank'] <= config['accounts'][account]['autoleague']['position'] \
+            and (known['next_league'] or 0) > now:
+        return known['next_league']
+    return None
+
+def fetch_snapshot(account, features: list[str]) -> AccountSnapshot:
+    # The profile, leaderboard and privacy settings live on different hosts and don't depend on each other,
+    #   so they're requested concurrently: a check costs about one round trip instead of one per read.
+    # The privacy settings are only needed to enter a leaderboard, so they're only read for accounts
+    #   that haven't been seen on one yet
+    user_id = config['accounts'][account]['id']
+    reads = {}
+    if "streak" in features and streak_verified(user_id) is None:
+        reads["profile"] = lambda: get_duo_info(account, STREAK_FIELDS, DEBUG)
+    if "league" in features:
+        reads["leaderboard"] = lambda: fetch_leaderboard(account)
+        known = get_state().get(user_id)
+        if not known or known['league_rank'] is None:
+            reads["private"] = lambda: fetch_private(account)
+    if len(reads) <= 1:
+        results = {name: read() for name, read in reads.items()}
+    else:
+        lines = output_buffer()
+        def buffered(read):
+            # Reads print into the check's buffer, not straight to the screen
+            def run():
+                set_output_buffer(lines)
+                try:
+                    return read()
+                finally:
+                    set_output_buffer(None)
+            return run
+        futures = {name: get_pool().submit(buffered(read)) for name, read in reads.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+    leaderboard_status, leaderboard = results.get("leaderboard", (None, None))
+    return AccountSnapshot(results.get("profile"), leaderboard_status, leaderboard, results.get("private"))
+
+def save_streak(account, snapshot: AccountSnapshot | None = None):
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] Checking streak for {config['accounts'][account]['username']}")
-    duo_info = get_duo_info(account, DEBUG)
+    user_id = config['accounts'][account]['id']
+    verified = streak_verified(user_id)
+    if verified is not None:
+        if DEBUG:
+            print(f"{current_time()} [bold magenta][DEBUG][/] Streak was already verified for today")
+        return verified
+    duo_info = snapshot.profile if snapshot and snapshot.profile else get_duo_info(account, STREAK_FIELDS, DEBUG)
+    if duo_info is None:
+        print(f"{current_time()} [red]Failed to get Duolingo info, checking the streak again later.[/]")
+        return retry_at()
     headers = get_headers(account)
-    user_tz = pytz.timezone(TIMEZONE)
+    user_tz = account_timezone(duo_info)
     now = datetime.now(user_tz)
-    streak_data = duo_info.get('streakData', {})
+    deadline = next_midnight(user_tz)
+    streak_data = duo_info.streak_data or {}
     current_streak = streak_data.get('currentStreak', {})
     should_do_lesson = True
     if current_streak:
@@ -155,12 +338,13 @@ def save_streak(account):
             last_extended = user_tz.localize(last_extended)
             should_do_lesson = last_extended.date() < now.date()
     if not should_do_lesson:
-        return
+        get_state().record_streak(user_id, now.date().isoformat(), user_tz.zone)
+        return deadline + STREAK_MARGIN
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] Attempting to save streak")
 
-    fromLanguage = duo_info.get('fromLanguage', 'Unknown')
-    learningLanguage = duo_info.get('learningLanguage', 'Unknown')
+    fromLanguage = duo_info.from_language or 'Unknown'
+    learningLanguage = duo_info.learning_language or 'Unknown'
     session_payload = {
         "challengeTypes": [
             "assist", "characterIntro", "characterMatch", "characterPuzzle",
@@ -190,7 +374,7 @@ def save_streak(account):
         "type": "GLOBAL_PRACTICE"
     }
     session_url = "https://www.duolingo.com/2017-06-30/sessions"
-    response = requests.post(session_url, headers=headers, json=session_payload, timeout=10)
+    response = client.post(session_url, headers=headers, json=session_payload)
 
     if response.status_code == 200:
         if DEBUG:
@@ -200,16 +384,12 @@ def save_streak(account):
         print(f"{current_time()} [red]An error has occurred while trying to create a session.[/]")
         if DEBUG:
             _print("\a", end="")
-            print(
-                f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-            )
-        return
+        return retry_at(deadline)
     if 'id' not in session_data:
         print(f"{current_time()} [red]Session ID not found in response data.[/]")
         if DEBUG:
             _print("\a", end="")
-        return
+        return retry_at(deadline)
 
     start_time = now.timestamp()
     end_time = datetime.now(user_tz).timestamp()
@@ -225,131 +405,330 @@ def save_streak(account):
     }
     update_url = f"https://www.duolingo.com/2017-06-30/sessions/{session_data['id']}"
 
-    response = requests.put(update_url, headers=headers, json=update_payload, timeout=10)
+    response = client.put(update_url, headers=headers, json=update_payload)
     if response.status_code == 200:
         if DEBUG:
             print(f"{current_time()} [bold magenta][DEBUG][/] Updated session")
         update_data = response.json()
+        invalidate_duo_info(account)
         if update_data.get('xpGain') is not None:
             print(f"{current_time()} [green]Saved streak![/]")
             if DEBUG:
                 print(f"{current_time()} [bold magenta][DEBUG][/] {update_data.get('xpGain') = }")
-        else:
-            print(f"{current_time()} [red]Failed to save streak.[/]")
-            if DEBUG:
-                _print("\a", end="")
+            get_state().record_streak(user_id, now.date().isoformat(), user_tz.zone)
+            return deadline + STREAK_MARGIN
+        print(f"{current_time()} [red]Failed to save streak.[/]")
+        if DEBUG:
+            _print("\a", end="")
     else:
         print(f"{current_time()} [red]Failed to update session to save streak.[/]")
         if DEBUG:
             _print("\a", end="")
-            print(
-                f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-            )
+    return retry_at(deadline)
 
-def save_league(account, position):
+def save_league(account, position, account_snapshot: AccountSnapshot | None = None):
     if DEBUG:
         print(f"{current_time()} [bold magenta][DEBUG][/] Checking league position for {config['accounts'][account]['username']}")
-    headers = get_headers(account)
     duo_id = int(config['accounts'][account]['id'])
 
-    url = (f"https://duolingo-leaderboards-prod.duolingo.com/leaderboards/7d9f5dd1-8423-491a-91f2-2532052038ce/users/{duo_id}"
-           f"?client_unlocked=true&get_reactions=true&_={int(time.time() * 1000)}")
-    while True:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code != 200:
-            if DEBUG:
-                _print("\a", end="")
-                print(
-                    f"{current_time()} [bold magenta][DEBUG][/] Failed to fetch user data on leaderboard\n"
-                    f"{current_time()} [bold magenta][DEBUG][/] Status code: {response.status_code}\n"
-                    f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-                )
-            leaderboard_registration(account)
-            return
-        leaderboard_data = response.json()
-        if not leaderboard_data or 'active' not in leaderboard_data:
-            leaderboard_registration(account)
-            return
-        active_data = leaderboard_data.get('active', None)
-        if active_data is None or 'cohort' not in active_data:
-            leaderboard_registration(account)
-            return
-        cohort_data = active_data.get('cohort', {})
-        rankings = cohort_data.get('rankings', [])
-        current_user = next((user_data for user_data in rankings if user_data['user_id'] == duo_id), None)
-        if current_user is None:
-            leaderboard_registration(account)
-            return
-
-        current_score = current_user['score']
-        current_rank = next((index + 1 for index, user_data in enumerate(rankings) if user_data['user_id'] == duo_id), None)
-        if DEBUG:
-            print(
-                f"{current_time()} [bold magenta][DEBUG][/] {current_score = }\n"
-                f"{current_time()} [bold magenta][DEBUG][/] {current_rank = }"
-            )
-        if current_rank is not None and current_rank <= position:
-            break
-        target_user = rankings[position - 1] if position and position - 1 < len(rankings) else None
+    if account_snapshot and account_snapshot.leaderboard_status is not None:
+        status, leaderboard_data = account_snapshot.leaderboard_status, account_snapshot.leaderboard
+    else:
+        status, leaderboard_data = fetch_leaderboard(account)
+    was_private = account_snapshot.private if account_snapshot else None
+    if status != 200:
         if DEBUG:
-            print(f"{current_time()} [bold magenta][DEBUG][/] {target_user = }")
-        if target_user is None:
-            break
-        target_score = target_user['score']
-        xp_needed = (target_score - current_score) + 60
+            _print("\a", end="")
+            print(f"{current_time()} [bold magenta][DEBUG][/] Failed to fetch user data on leaderboard")
+        leaderboard_registration(account, was_private)
+        return retry_at()
+    snapshot = LeaderboardSnapshot.from_response(leaderboard_data)
+    if snapshot is None or duo_id not in snapshot:
+        leaderboard_registration(account, was_private)
+        return retry_at()
+
+    current_score = snapshot.score(duo_id)
+    current_rank = snapshot.rank(duo_id)
+    if DEBUG:
+        print(
+            f"{current_time()} [bold magenta][DEBUG][/] {current_score = }\n"
+            f"{current_time()} [bold magenta][DEBUG][/] {current_rank = }"
+        )
+    planner = get_planner() if config.get('league_planner', True) and snapshot.contest_end else None
+    plan = None
+    topup_at = None
+    if planner:
+        planner.record(duo_id, snapshot)
+        topup_at = snapshot.contest_end - TOPUP_LEAD
+        if time.time() >= topup_at:
+            plan = planner.plan(duo_id, snapshot, position)
+        elif DEBUG:
+            projected = planner.plan(duo_id, snapshot, position)
+            print(f"{current_time()} [bold magenta][DEBUG][/] Projected extra top-up: {projected.xp if projected else 0} XP at "
+                  f"{datetime.fromtimestamp(topup_at).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # Only the final standings count, so before the top-up the cohort is just sampled sparsely. The current gap is
+    #   still closed right away if it's too large to leave for the top-up, or if no check is due before then
+    xp_needed = snapshot.xp_needed(duo_id, position, margin=60)
+    if topup_at is not None and time.time() < topup_at:
+        next_check = max(time.time() + MIN_INTERVAL, min(topup_at, time.time() + SAMPLE_INTERVAL))
+        if xp_needed <= SAFETY_GAP and next_check <= topup_at:
+            if DEBUG and xp_needed > 0:
+                print(f"{current_time()} [bold magenta][DEBUG][/] Leaving the current gap of {xp_needed} XP for the top-up")
+            xp_needed = 0
+    else:
+        # The planned top-up covers where competitors are heading; the current gap is the floor
+        xp_needed = max(xp_needed, plan.xp if plan else 0)
+        next_check = None
+    if xp_needed > 0:
         if DEBUG:
             print(
-                f"{current_time()} [bold magenta][DEBUG][/] {target_score = }\n"
-                f"{current_time()} [bold magenta][DEBUG][/] {xp_needed = }"
+                f"{current_time()} [bold magenta][DEBUG][/] target_user = {snapshot.at(position)}\n"
+                f"{current_time()} [bold magenta][DEBUG][/] {xp_needed = }\n"
+                f"{current_time()} [bold magenta][DEBUG][/] Attempting to save league position"
             )
-        if xp_needed > 0:
-            if DEBUG:
-                print(f"{current_time()} [bold magenta][DEBUG][/] Attempting to save league position")
-            farm_xp(account, xp_needed)
-            print(f"{current_time()} [green]Saved league position![/]")
+        farmed = farm_xp(account, xp_needed)
+        if planner:
+            planner.record_decision(duo_id, snapshot, position, farmed, plan)
+        # The farmed XP is applied to the snapshot instead of refetching the leaderboard;
+        #   the next scheduled check verifies it against the server
+        snapshot = snapshot.with_score(duo_id, current_score + farmed)
+        print(f"{current_time()} [green]Saved league position![/]")
 
-try:
-    clear()
-    print(title_string)
-    print("\n[yellow]  Press Ctrl+C to stop the saver.[/]\n")
-    print("[blue]  Starting saver...[/]", end="")
-    _print("\r", end="")
+    get_state().record_league(duo_id, snapshot.rank(duo_id), snapshot.score(duo_id), snapshot.contest_end)
+    return next_check or league_next_check(snapshot.contest_end)
 
-    if not any(acc['autostreak'] or acc['autoleague']['active'] for acc in config['accounts']):
-        print("[red]  There are no accounts with a saver feature enabled![/]\n")
-        sys.exit()
+def saver_features(acc: dict) -> list[str]:
+    features = []
+    if acc['autostreak']:
+        features.append("streak")
+    if acc['autoleague']['active'] and acc['autoleague']['position']:
+        features.append("league")
+    return features
 
-    while True:
-        for account in range(len(config['accounts'])):
-            autostreak = config['accounts'][account]['autostreak']
-            autoleague = config['accounts'][account]['autoleague']['active']
-            league_pos = config['accounts'][account]['autoleague']['position']
-            delay      = config['delay']
+def run_check(account: int, feature: str, snapshot: AccountSnapshot | None = None) -> float:
+    # Runs one saver feature for an account and returns when it should be checked next
+    if feature == "streak":
+        return save_streak(account, snapshot)
+    return save_league(account, config['accounts'][account]['autoleague']['position'], snapshot)
 
-            if autostreak or autoleague:
+def check_account(account: int, features: list[str]) -> tuple[dict[str, float], list]:
+    # Runs the due features of one account (on a worker thread) and returns when each should be checked next,
+    #   along with the buffered output
+    lines = []
+    set_output_buffer(lines)
+    try:
+        with profiler.thread_profile():
+            user_id = config['accounts'][account]['id']
+            if DEBUG:
+                print(f"{current_time()} [bold magenta][DEBUG][/] ----------------------------------------")
+            print(f"{current_time()} [blue]Checking [bold]{config['accounts'][account]['username']}[/] ...[/]")
+            try:
+                snapshot = fetch_snapshot(account, features)
+            except Exception as e:
+                # Each feature falls back to fetching what it needs (and reports the error) on its own
                 if DEBUG:
-                    print(f"{current_time()} [bold magenta][DEBUG][/] ----------------------------------------")
-                print(f"{current_time()} [blue]Checking [bold]{config['accounts'][account]['username']}[/] ...[/]")
+                    print(f"{current_time()} [bold magenta][DEBUG][/] Failed to fetch account snapshot: {e}")
+                snapshot = None
+            next_checks = {}
+            for feature in features:
                 try:
-                    save_streak(account) if autostreak else None
-                    save_league(account, league_pos) if autoleague and league_pos else None
+                    next_check = run_check(account, feature, snapshot)
+                except breaker.CircuitOpen as e:
+                    # Nothing goes out for this account until the cool-down has passed
+                    print(f"{current_time()} [yellow]Rate limited, checking {config['accounts'][account]['username']} again in {e.retry_in:.0f}s[/]")
+                    next_check = time.time() + max(MIN_INTERVAL, e.retry_in)
                 except Exception as e:
                     _print("\a", end="")
                     print(f"[red][bold]An unexpected error occurred while trying to save {config['accounts'][account]['username']}: {e}[/]\nDetailed error:[/]")
-                    traceback.print_exc()
+                    print(escape(traceback.format_exc().rstrip()))
+                    next_check = retry_at()
+                next_checks[feature] = next_check
+                get_state().record_next_check(user_id, feature, next_check)
+        return next_checks, lines
+    finally:
+        set_output_buffer(None)
 
-        print(f"{current_time()} [blue]Waiting {delay} seconds...[/]")
-        time.sleep(delay)
+def apply_config(new_config: dict, scheduler: Scheduler):
+    # Applies a reloaded config between checks, only rescheduling the accounts whose saver settings changed
+    global DEBUG
+    old_accounts = {acc['id']: acc for acc in config['accounts']}
+    new_accounts = {acc['id']: acc for acc in new_config.get('accounts', [])}
+    changed = set()
+    for user_id in old_accounts.keys() | new_accounts.keys():
+        old, new = old_accounts.get(user_id), new_accounts.get(user_id)
+        old_features = set(saver_features(old)) if old else set()
+        new_features = set(saver_features(new)) if new else set()
+        for feature in old_features - new_features:
+            scheduler.cancel((user_id, feature))
+            changed.add(user_id)
+        for feature in new_features - old_features:
+            scheduler.schedule((user_id, feature), time.time())
+            changed.add(user_id)
+        if old and new and "league" in old_features & new_features \
+                and old['autoleague']['position'] != new['autoleague']['position']:
+            scheduler.schedule((user_id, "league"), time.time())
+            changed.add(user_id)
+        if old and new and old['token'] != new['token']:
+            changed.add(user_id)
 
-except KeyboardInterrupt:
-    _print("\r\033[2K", end="")
-    print("\n  [bright_red]Stopping saver...[/]\n")
-    sys.exit()
+    tokens_changed = [user_id for user_id in changed if user_id in old_accounts and user_id in new_accounts
+                      and old_accounts[user_id]['token'] != new_accounts[user_id]['token']]
+    delay_changed = new_config.get('delay') != config.get('delay')
+
+    # Updated in place, so DuoKLI and utils keep seeing the same object
+    configfile.store.replace(new_config)
+    DEBUG = config['debug']
+    client.set_debug(DEBUG)
+    logger.configure(config)
+    breaker.configure(config)
+    for index, acc in enumerate(config['accounts']):
+        if acc['id'] in tokens_changed:
+            invalidate_duo_info(index)
+
+    if changed or delay_changed:
+        print(f"{current_time()} [blue]Reloaded {CONFIG_FILE}: {len(changed)} account(s) rescheduled{', new delay ' + str(config['delay']) + 's' if delay_changed else ''}[/]")
+
+def run(cfg: dict, stop_event: threading.Event):
+    # Runs the saver until `stop_event` is set or Ctrl+C is pressed.
+    # `cfg` is used as-is (not copied), so the caller's config and HTTP caches are shared with the saver.
+    global config, DEBUG
+    config = cfg
+    DEBUG = config['debug']
+    logger.configure(config)
+    breaker.configure(config)
+    profiler.configure(config)
+    client.set_debug(DEBUG)
+    metrics.registry.reset()
+    _stop.clear()
+    profile_summary = []
+
+    # Profiles the whole run when profiling is enabled; the report is written when the saver stops
+    with profiler.session("saver", config, profile_summary):
+        try:
+            clear()
+            print(title_string())
+            print("\n[yellow]  Press Ctrl+C to stop the saver.[/]\n")
+            print("[blue]  Starting saver...[/]", end="")
+            _print("\r", end="")
+
+            if not any(saver_features(acc) for acc in config['accounts']):
+                print("[red]  There are no accounts with a saver feature enabled![/]\n")
+                return
+
+            scheduler = Scheduler()
+            for acc in config['accounts']:
+                for feature in saver_features(acc):
+                    # Pick up where the previous run left off instead of re-checking everything on launch
+                    scheduler.schedule((acc['id'], feature), max(time.time(), get_state().next_check(acc['id'], feature) or 0))
+
+            from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+            pool = ThreadPoolExecutor(max_workers=config.get('saver_workers', DEFAULT_WORKERS), thread_name_prefix="saver")
+            # At most one check per account is in flight; features that come due meanwhile wait for it to finish
+            in_flight: dict[int, tuple["Future", list[str]]] = {}
+            waiting: dict[int, list[str]] = {}
+            pending_config = None
 
-except Exception as e:
-    _print("\a", end="")
-    print(f"[red][bold]An unexpected error occurred: {e}[/]\nDetailed error:[/]")
-    traceback.print_exc()
+            announce = True
+            try:
+                while not stop_event.is_set():
+                    indexes = {acc['id']: i for i, acc in enumerate(config['accounts'])}
+                    for user_id, feature in scheduler.pop_due(time.time()):
+                        # Checks the saver state already settles are rescheduled without fetching anything
+                        next_check = settled(indexes[user_id], feature) if user_id in indexes else None
+                        if next_check is not None:
+                            if DEBUG:
+                                print(f"{current_time()} [bold magenta][DEBUG][/] Skipping {feature} check for {config['accounts'][indexes[user_id]]['username']} "
+                                      f"until {datetime.fromtimestamp(next_check):%Y-%m-%d %H:%M:%S} (already settled)")
+                            scheduler.schedule((user_id, feature), next_check)
+                            get_state().record_next_check(user_id, feature, next_check)
+                            announce = True
+                            continue
+                        waiting.setdefault(user_id, []).append(feature)
+
+                    for user_id in list(waiting):
+                        if user_id in in_flight:
+                            continue
+                        features = waiting.pop(user_id)
+                        if user_id in indexes:
+                            in_flight[user_id] = (pool.submit(check_account, indexes[user_id], features), features)
+
+                    next_due = scheduler.next_due()
+                    timeout = min(max(0, next_due[0] - time.time()) if next_due else CONFIG_POLL_INTERVAL, CONFIG_POLL_INTERVAL)
+                    if in_flight:
+                        wait([future for future, _ in in_flight.values()], timeout=timeout, return_when=FIRST_COMPLETED)
+                    elif stop_event.wait(timeout):
+                        break
+
+                    finished = 0
+                    for user_id, (future, features) in list(in_flight.items()):
+                        if not future.done():
+                            continue
+                        del in_flight[user_id]
+                        finished += 1
+                        try:
+                            next_checks, lines = future.result()
+                        except Exception as e:
+                            print(f"[red][bold]An unexpected error occurred while checking an account: {e}[/][/]")
+                            next_checks, lines = {feature: retry_at() for feature in features}, []
+                        flush_output(lines)
+                        for feature, next_check in next_checks.items():
+                            scheduler.schedule((user_id, feature), next_check)
+
+                    if finished:
+                        if DEBUG:
+                            print(f"{current_time()} [bold magenta][DEBUG][/] Profile cache: {profile_cache_stats['hits']} hits, {profile_cache_stats['misses']} misses")
+                            stats = client.conditional_stats
+                            print(
+                                f"{current_time()} [bold magenta][DEBUG][/] Conditional requests: {stats['not_modified']}/{stats['requests']} not modified, "
+                                f"{stats['bytes_saved'] / 1024:,.1f} KiB and {stats['parses_saved']} parses saved"
+                            )
+                        write_metrics()
+                    if (finished or announce) and not in_flight and not waiting:
+                        if len(scheduler):
+                            when, (user_id, feature) = scheduler.next_due()
+                            username = next(acc['username'] for acc in config['accounts'] if acc['id'] == user_id)
+                            print(f"{current_time()} [blue]Next check: [bold]{username}[/] ({feature}) at {datetime.fromtimestamp(when):%Y-%m-%d %H:%M:%S}[/]")
+                        else:
+                            print(f"{current_time()} [yellow]No saver features enabled, waiting for {CONFIG_FILE} to change...[/]")
+                        announce = False
+
+                    # Account indexes are fixed while checks are running, so a reloaded config waits for them
+                    pending_config = configfile.store.poll() or pending_config
+                    if pending_config is not None and not in_flight:
+                        apply_config(pending_config, scheduler)
+                        pending_config = None
+                        announce = True
+            finally:
+                # Farms stop at their next request; finished checks are still reported and were already saved
+                _stop.set()
+                pool.shutdown(wait=True, cancel_futures=True)
+                # A later run may use a different `saver_workers`
+                shutdown_pool()
+                for future, _ in in_flight.values():
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        flush_output(future.result()[1])
+
+        except KeyboardInterrupt:
+            stop_event.set()
+            _print("\r\033[2K", end="")
+
+        except Exception as e:
+            _print("\a", end="")
+            print(f"[red][bold]An unexpected error occurred: {e}[/]\nDetailed error:[/]")
+            traceback.print_exc()
+
+    if DEBUG:
+        print(f"{current_time()} [bold magenta][DEBUG][/] Requests:")
+        for line in metrics.registry.summary():
+            print(f"{current_time()} [bold magenta][DEBUG][/]   {line}")
+    write_metrics()
+    if profile_summary:
+        print("\n  [bold magenta]Profile:[/]")
+        for line in profile_summary:
+            print(f"  [magenta]{escape(line)}[/]")
     print("\n  [bright_red]Stopping saver...[/]\n")
+
+if __name__ == "__main__":
+    run(config, threading.Event())
     sys.exit()
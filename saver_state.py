@@ -0,0 +1,78 @@
+import sqlite3, threading, time
+
+# Persistent saver state, so a restarted saver knows what it already verified.
+# SQLite in WAL mode with a busy timeout lets DuoKLI and a running saver write to it at the same time;
+#   every write is a single upsert inside its own IMMEDIATE transaction.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    user_id        INTEGER PRIMARY KEY,
+    streak_date    TEXT,     -- last date (in streak_tz) the streak was verified as extended
+    streak_tz      TEXT,
+    streak_checked REAL,     -- unix time of the last streak check
+    league_rank    INTEGER,
+    league_score   INTEGER,
+    league_end     REAL,     -- unix time the contest the rank belongs to ends
+    league_checked REAL,     -- unix time of the last league check
+    next_streak    REAL,     -- unix time the scheduler planned the next streak check for
+    next_league    REAL      -- unix time the scheduler planned the next league check for
+)
+"""
+
+COLUMNS = ("streak_date", "streak_tz", "streak_checked", "league_rank", "league_score",
+           "league_end", "league_checked", "next_streak", "next_league")
+
+class SaverState:
+    def __init__(self, path: str = "saver_state.db"):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.execute(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def get(self, user_id: int) -> dict | None:
+        row = self.connection().execute("SELECT * FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, user_id: int, **values):
+        unknown = set(values) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown saver state column(s): {', '.join(unknown)}")
+        names = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        assignments = ", ".join(f"{k} = excluded.{k}" for k in values)
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"INSERT INTO accounts (user_id, {names}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(user_id) DO UPDATE SET {assignments}",
+                (user_id, *values.values()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_streak(self, user_id: int, date: str, tz: str):
+        self.update(user_id, streak_date=date, streak_tz=tz, streak_checked=time.time())
+
+    def record_league(self, user_id: int, rank: int | None, score: int | None, end: float | None):
+        self.update(user_id, league_rank=rank, league_score=score, league_end=end, league_checked=time.time())
+
+    def record_next_check(self, user_id: int, feature: str, when: float):
+        self.update(user_id, **{f"next_{feature}": when})
+
+    def next_check(self, user_id: int, feature: str) -> float | None:
+        state = self.get(user_id)
+        return state.get(f"next_{feature}") if state else None
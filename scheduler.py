@@ -0,0 +1,55 @@
+import heapq, itertools, threading
+
+# Priority queue of "check X at time T" entries, used by the saver.
+# Keys are arbitrary hashables (the saver uses (user_id, feature)); rescheduling a key replaces its
+#   previous entry, which stays in the heap as a stale tuple and is skipped when it surfaces.
+
+class Scheduler:
+    def __init__(self):
+        self.heap: list[tuple[float, int, object]] = []
+        self.due: dict[object, tuple[float, int]] = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def schedule(self, key, when: float):
+        with self.lock:
+            seq = next(self.counter)
+            self.due[key] = (when, seq)
+            heapq.heappush(self.heap, (when, seq, key))
+
+    def cancel(self, key):
+        with self.lock:
+            self.due.pop(key, None)
+
+    def when(self, key) -> float | None:
+        with self.lock:
+            entry = self.due.get(key)
+            return entry[0] if entry else None
+
+    def _drop_stale(self):
+        while self.heap and self.due.get(self.heap[0][2], (None, None))[1] != self.heap[0][1]:
+            heapq.heappop(self.heap)
+
+    def next_due(self) -> tuple[float, object] | None:
+        with self.lock:
+            self._drop_stale()
+            return (self.heap[0][0], self.heap[0][2]) if self.heap else None
+
+    def pop_due(self, now: float) -> list:
+        # Removes and returns every key due at or before `now`, earliest first
+        keys = []
+        with self.lock:
+            self._drop_stale()
+            while self.heap and self.heap[0][0] <= now:
+                _, _, key = heapq.heappop(self.heap)
+                del self.due[key]
+                keys.append(key)
+                self._drop_stale()
+        return keys
+
+    def keys(self) -> list:
+        with self.lock:
+            return list(self.due)
+
+    def __len__(self):
+        return len(self.due)
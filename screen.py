@@ -0,0 +1,74 @@
+import os, sys, shutil
+from rich import get_console
+
+# Draws menus in place. The last frame is kept, and `render` only rewrites the lines that changed using
+#   ANSI cursor movement, so e.g. greying out the unselected options of a menu rewrites those lines
+#   instead of clearing the terminal and printing the whole menu again. Nothing spawns a subprocess.
+# Frames start at the top of the screen, and whatever was printed below the last frame is erased by the
+#   next render. After output that may have scrolled the screen (farming, the saver, updates...), call
+#   `invalidate` so the next frame is drawn from scratch.
+
+CLEAR = "\033[H\033[2J\033[3J"
+
+_frame: list[str] | None = None
+
+def _enable_vt():
+    # Windows consoles only interpret ANSI escape sequences with virtual terminal processing enabled
+    if os.name != "nt":
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+    except Exception:
+        pass
+
+_enable_vt()
+
+def _write(s: str):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+def invalidate():
+    global _frame
+    _frame = None
+
+def clear():
+    invalidate()
+    if sys.stdout.isatty():
+        _write(CLEAR)
+
+def to_rows(lines: list[str]) -> list[str]:
+    # Renders rich markup the way `print` would and splits it into terminal rows
+    console = get_console()
+    with console.capture() as capture:
+        for line in lines:
+            console.print(line)
+    return capture.get().split("\n")[:-1]
+
+def render(lines: list[str]):
+    global _frame
+    if not sys.stdout.isatty():
+        for row in to_rows(lines):
+            _write(row + "\n")
+        return
+
+    rows = to_rows(lines)
+    if len(rows) >= shutil.get_terminal_size().lines:
+        # Cursor addressing only works if the frame fits on the screen
+        _write(CLEAR + "".join(row + "\n" for row in rows))
+        _frame = None
+        return
+
+    previous = _frame
+    out = [CLEAR] if previous is None else []
+    for i, row in enumerate(rows):
+        if previous is None or i >= len(previous) or previous[i] != row:
+            out.append(f"\033[{i + 1};1H{row}\033[K")
+    # Leave the cursor below the frame and erase anything printed there since the last render
+    out.append(f"\033[{len(rows) + 1};1H\033[J")
+    _write("".join(out))
+    _frame = rows
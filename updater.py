@@ -1,26 +1,115 @@
-import sys, os, requests, zipfile, tempfile, shutil
-import re
-import json
+import sys, os, re, json, time, threading, builtins, hashlib, fnmatch
 from pathlib import Path
 import version
+import keys
+import configfile
+import logger
+
+# requests, tarfile and shutil are imported by the functions that download and apply updates,
+#   so the background check doesn't add anything to startup.
 
 APP_DIR = Path.cwd()
 
 UPDATE_DIR = version.UPDATE_DIR
+# Last known release and its ETag: checks within `update_check_interval` seconds don't hit GitHub at all,
+#   later ones are conditional, so an unchanged release costs a 304
+RELEASE_CACHE = UPDATE_DIR / "release.json"
+
+DEFAULT_CHECK_INTERVAL = 6 * 3600
+
+# Updates only replace the files that changed between the installed version and the release.
+# MANIFEST lists every file of a staged release (path -> sha256) and which ones it changes;
+#   INSTALLED_MANIFEST is the list of the last applied release, used to remove files a newer release dropped
+MANIFEST = "manifest.json"
+INSTALLED_MANIFEST = UPDATE_DIR / "installed.json"
+# Written while an update is being applied, with the files replaced so far kept in BACKUP_DIR
+APPLYING = UPDATE_DIR / "applying.json"
+BACKUP_DIR = UPDATE_DIR / "backup"
+# User files that an update never writes or removes, even if a release happens to contain them
+PROTECTED = [
+    "config.json", "config.json.lock", "duokli.log*", "saver_state.db*", "league_history.jsonl*",
+    "task_journal.jsonl*", "profiles/*", "*.tmp", ".duokli_update/*",
+]
+
+# (tag, staged directory) of an update downloaded by the background check, until it's offered
+_staged: tuple[str, Path] | None = None
+_staged_lock = threading.Lock()
 
 def apply_update(staged_dir: Path, target_dir: Path = APP_DIR):
+    import shutil
     if not staged_dir.exists():
         return
-    for item in staged_dir.iterdir():
-        dest = target_dir / item.name
-        if dest.exists():
-            if dest.is_dir():
-                shutil.rmtree(dest)
-            else:
-                dest.unlink()
-        shutil.move(str(item), str(dest))
-    staged_dir.rmdir()
-    
+    manifest_path = staged_dir / MANIFEST
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    # Only files that an earlier release installed are removed, never anything the user created
+    installed = load_installed_manifest()
+    removed = [name for name in installed.get("files", {}) if name not in manifest["files"] and not is_protected(name)]
+    # Every changed file is already on its destination's filesystem (the staging directory is inside the app
+    #   directory), so each one is swapped in with a single rename. The file it replaces is moved to BACKUP_DIR first,
+    #   and APPLYING records what's being done, so an update that fails halfway is rolled back here and one that was
+    #   interrupted is rolled back by `recover` on the next launch; either way no mix of versions is left behind
+    shutil.rmtree(BACKUP_DIR, ignore_errors=True)
+    BACKUP_DIR.mkdir(parents=True)
+    save_applying({
+        "tag": manifest["tag"], "staged": str(staged_dir), "target": str(target_dir),
+        "changed": manifest["changed"], "removed": removed,
+        "new": [name for name in manifest["changed"] if not (target_dir / name).exists()],
+    })
+    try:
+        for name in manifest["changed"]:
+            dest = target_dir / name
+            if dest.exists():
+                (BACKUP_DIR / name).parent.mkdir(parents=True, exist_ok=True)
+                os.replace(dest, BACKUP_DIR / name)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged_dir / name, dest)
+        for name in removed:
+            if (target_dir / name).exists():
+                (BACKUP_DIR / name).parent.mkdir(parents=True, exist_ok=True)
+                os.replace(target_dir / name, BACKUP_DIR / name)
+    except BaseException:
+        rollback()
+        raise
+    save_installed_manifest({"tag": manifest["tag"], "files": manifest["files"]})
+    APPLYING.unlink()
+    shutil.rmtree(BACKUP_DIR, ignore_errors=True)
+    shutil.rmtree(staged_dir, ignore_errors=True)
+
+def save_applying(state: dict):
+    UPDATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = APPLYING.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, APPLYING)
+
+def rollback():
+    # Puts back every file the update in APPLYING replaced or removed and deletes the ones it added. Files already
+    #   taken out of the staging directory can't be swapped in again, so it's removed and the release is staged anew
+    import shutil
+    try:
+        with open(APPLYING, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    target_dir = Path(state["target"])
+    for name in state["changed"] + state["removed"]:
+        dest = target_dir / name
+        if (BACKUP_DIR / name).exists():
+            os.replace(BACKUP_DIR / name, dest)
+        elif name in state["new"] and dest.exists():
+            dest.unlink()
+    shutil.rmtree(state["staged"], ignore_errors=True)
+    APPLYING.unlink()
+    shutil.rmtree(BACKUP_DIR, ignore_errors=True)
+
+def recover() -> bool:
+    # Called at launch: rolls back an update that was interrupted while it was being applied.
+    # Returns whether anything was rolled back
+    if not APPLYING.exists():
+        return False
+    rollback()
+    return True
 
 def parse_version(v: str):
     if not v:
@@ -33,62 +122,173 @@ def parse_version(v: str):
 def is_newer(latest: str):
     return parse_version(latest) > parse_version(version.__version__)
 
-def get_latest_release():
-    r = requests.get(version.GITHUB_API, timeout=10)
+def load_release_cache() -> dict:
+    try:
+        with open(RELEASE_CACHE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_release_cache(cache: dict):
+    UPDATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = RELEASE_CACHE.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp, RELEASE_CACHE)
+
+def get_latest_release(cfg: dict | None = None, force: bool = False):
+    import requests
+    cfg = cfg if cfg is not None else configfile.load()
+    cache = load_release_cache()
+    release = cache.get("release")
+    if release and not force and time.time() - cache.get("checked", 0) < cfg.get("update_check_interval", DEFAULT_CHECK_INTERVAL):
+        return release
+
+    headers = {"accept": "application/vnd.github+json"}
+    if release and cache.get("etag"):
+        headers["if-none-match"] = cache["etag"]
+    r = requests.get(version.GITHUB_API, headers=headers, timeout=10)
+    if r.status_code == 304 and release:
+        cache["checked"] = time.time()
+        save_release_cache(cache)
+        return release
     if r.status_code != 200:
         if r.status_code == 404:
             raise Exception(f"GitHub returned status code 404. Your current repo ({version.GITHUB_USER}/{version.GITHUB_REPO}) does not have any releases.")
         raise Exception(f"GitHub returned status code {r.status_code}.")
-    return r.json()
+    data = r.json()
+    release = {k: data.get(k) for k in ("tag_name", "zipball_url", "tarball_url")}
+    save_release_cache({"checked": time.time(), "etag": r.headers.get("etag"), "release": release})
+    return release
 
-def download_release(url: str):
-    tmp = Path(tempfile.mkdtemp())
-    zip_path = tmp / "update.zip"
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
-        with open(zip_path, "wb") as f:
-            for chunk in r.iter_content(8192):
-                f.write(chunk)
+def is_protected(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in PROTECTED)
 
-    extract_dir = tmp / "extracted"
-    with zipfile.ZipFile(zip_path) as z:
-        z.extractall(extract_dir)
+def file_hash(path: Path) -> str | None:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
 
-    return extract_dir
+def load_installed_manifest() -> dict:
+    try:
+        with open(INSTALLED_MANIFEST, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def stage_update(extract_dir: Path, tag: str):
-    if UPDATE_DIR.exists() and not UPDATE_DIR.is_dir():
-        shutil.rmtree(UPDATE_DIR)
+def save_installed_manifest(manifest: dict):
     UPDATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = INSTALLED_MANIFEST.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, INSTALLED_MANIFEST)
+
+def stage_delta(url: str, tag: str, target_dir: Path = APP_DIR) -> Path:
+    # Streams the release tarball and hashes every file in it against the installed copy; only the files that
+    #   differ are written to the staging directory, along with a manifest of the release
+    import requests, tarfile, shutil
+    staged_dir = UPDATE_DIR / tag.lstrip("v")
+    if staged_dir.exists():
+        shutil.rmtree(staged_dir)
+    staged_dir.mkdir(parents=True)
+
+    files, changed = {}, []
+    with requests.get(url, stream=True, timeout=30) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        with tarfile.open(fileobj=r.raw, mode="r|gz") as tar:
+            for member in tar:
+                # Every path is inside a "<owner>-<repo>-<commit>/" directory
+                parts = Path(member.name).parts[1:]
+                if not member.isfile() or not parts or ".." in parts:
+                    continue
+                name = Path(*parts).as_posix()
+                if is_protected(name):
+                    continue
+                data = tar.extractfile(member).read()
+                digest = hashlib.sha256(data).hexdigest()
+                files[name] = digest
+                if file_hash(target_dir / name) == digest:
+                    continue
+                dest = staged_dir / name
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                with open(dest, "wb") as f:
+                    f.write(data)
+                os.chmod(dest, member.mode & 0o777 or 0o644)
+                changed.append(name)
+
+    # The manifest is written last, so a staging directory without one is never applied
+    tmp = staged_dir / (MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"tag": tag, "files": files, "changed": changed}, f)
+    os.replace(tmp, staged_dir / MANIFEST)
+    return staged_dir
 
-    version_name = tag.lstrip("v")
-    target = UPDATE_DIR / version_name
+def is_staged(staged_path: Path) -> bool:
+    # A staging directory is only reused if it has its manifest and still holds every changed file
+    try:
+        with open(staged_path / MANIFEST, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return all((staged_path / name).is_file() for name in manifest["changed"])
 
-    if target.exists():
-        shutil.rmtree(target)
+def stage_release(release: dict) -> Path:
+    # Downloads and stages the files of a release that differ from the installed ones, unless an earlier run already did
+    staged_path = UPDATE_DIR / release["tag_name"].lstrip("v")
+    if not is_staged(staged_path):
+        url = release.get("tarball_url") or f"https://api.github.com/repos/{version.GITHUB_USER}/{version.GITHUB_REPO}/tarball/{release['tag_name']}"
+        stage_delta(url, release["tag_name"])
+    return staged_path
 
-    entries = list(extract_dir.iterdir())
-    if len(entries) == 1 and entries[0].is_dir():
-        src = entries[0]
-        shutil.move(str(src), str(target))
+def skip_version(cfg: dict, tag: str):
+    cfg.setdefault("skip_versions", [])
+    if tag not in cfg["skip_versions"]:
+        cfg["skip_versions"].append(tag)
         try:
-            extract_dir.rmdir()
+            configfile.save()
         except Exception:
-            shutil.rmtree(extract_dir, ignore_errors=True)
-    else:
-        shutil.move(str(extract_dir), str(target))
+            pass
+
+def restart_with_update(staged_path: Path, tag: str, print=builtins.print):
+    print(f"Applying update {tag} now...")
+    try:
+        apply_update(staged_path, APP_DIR)
+    except Exception as e:
+        print(f"Failed to apply update, {version.__version__} was restored:", e)
+        return
+
+    python = sys.executable
+    duo_script = APP_DIR / "DuoKLI.py"
+    if not duo_script.exists():
+        print(f"Cannot restart: {duo_script} not found.")
+        sys.exit(1)
+
+    print("Restarting DuoKLI...")
+    os.chdir(str(APP_DIR))
+    # atexit handlers don't run across execv, so write pending config changes and hand the terminal back
+    #   in its original mode here
+    configfile.flush()
+    keys.restore()
+    os.execv(python, [python, str(duo_script)])
 
 def check_and_stage_update(apply: bool = False, printing: bool = True, ask: bool = False, cfg: dict = None, debug: bool = False, autoupdating: bool = False):
+    # Synchronous check ("Check Updates" in the settings); ignores the check interval but still sends the ETag
     def print(*args, **kwargs):
         if printing:
-            __builtins__.print(*args, **kwargs)
+            builtins.print(*args, **kwargs)
+    cfg = cfg if cfg is not None else configfile.load()
     try:
-        release = get_latest_release()
+        release = get_latest_release(cfg, force=True)
         latest = release["tag_name"]
 
-        skip_versions = []
         skip_versions = cfg.get("skip_versions", [])
-        
+
         if is_newer(latest):
             if autoupdating and latest in skip_versions:
                 print(f"Skipping version {latest} (marked to skip in config).")
@@ -96,55 +296,62 @@ def check_and_stage_update(apply: bool = False, printing: bool = True, ask: bool
 
             response = "y"
             if ask:
-                response = input(f"A new version {latest} is available. Do you want to update now? (y/n/(s)kip): ").strip().lower()
+                response = keys.readline(f"A new version {latest} is available. Do you want to update now? (y/n/(s)kip): ").strip().lower()
             if response.startswith("s"):
-                target_cfg = cfg
-                if target_cfg is None:
-                    try:
-                        with open(APP_DIR / "config.json", "r") as f:
-                            target_cfg = json.load(f)
-                    except Exception:
-                        target_cfg = None
-
-                if isinstance(target_cfg, dict):
-                    target_cfg.setdefault("skip_versions", [])
-                    if latest not in target_cfg["skip_versions"]:
-                        target_cfg["skip_versions"].append(latest)
-                        try:
-                            with open(APP_DIR / "config.json", "w") as f:
-                                json.dump(target_cfg, f, indent=4)
-                        except Exception:
-                            pass
+                skip_version(cfg, latest)
                 print(f"Skipped version {latest}.")
                 return
             if response != 'y':
                 return
             print(f"DuoKLI update available: {latest}")
-            url = release["zipball_url"]
-            extract_dir = download_release(url)
-            stage_update(extract_dir, latest)
-            staged_path = UPDATE_DIR / latest.lstrip("v")
+            staged_path = stage_release(release)
+            with open(staged_path / MANIFEST, "r") as f:
+                print(f"{len(json.load(f)['changed'])} files changed.")
             if apply:
-                print(f"Applying update {latest} now...")
-                try:
-                    apply_update(staged_path, APP_DIR)
-                except Exception as e:
-                    print("Failed to apply update:", e)
-                    sys.exit(1)
-
-                python = sys.executable
-                duo_script = APP_DIR / "DuoKLI.py"
-                if not duo_script.exists():
-                    print(f"Cannot restart: {duo_script} not found.")
-                    sys.exit(1)
-
-                print("Restarting DuoKLI...")
-                os.chdir(str(APP_DIR))
-                os.execv(python, [python, str(duo_script)])
+                restart_with_update(staged_path, latest, print)
             else:
-                print(f"Update staged at {staged_path}. It will be applied on next launch.")
+                print(f"Update staged at {staged_path}. It will be offered again on next launch.")
                 sys.exit(0)
         else:
             print("DuoKLI is up to date.")
     except Exception as e:
         print("Failed to check for updates:", e)
+
+def background_check(cfg: dict):
+    # Checks for and downloads an update without printing anything; `offer_staged_update` shows it afterwards
+    global _staged
+    try:
+        release = get_latest_release(cfg)
+        latest = release["tag_name"]
+        if not is_newer(latest) or latest in cfg.get("skip_versions", []):
+            return
+        staged_path = stage_release(release)
+        with _staged_lock:
+            _staged = (latest, staged_path)
+    except Exception as e:
+        if cfg.get("debug"):
+            logger.debug("Background update check failed: %s", e)
+
+def start_background_check(cfg: dict) -> threading.Thread:
+    thread = threading.Thread(target=background_check, args=(cfg,), name="update-check", daemon=True)
+    thread.start()
+    return thread
+
+def offer_staged_update(ask: bool = True, cfg: dict | None = None) -> bool:
+    # Called between menus; does nothing until the background check has staged an update, which is then offered once.
+    # Returns whether anything was shown
+    global _staged
+    with _staged_lock:
+        staged, _staged = _staged, None
+    if staged is None:
+        return False
+    cfg = cfg if cfg is not None else configfile.load()
+    latest, staged_path = staged
+    response = "y"
+    if ask:
+        response = keys.readline(f"\n DuoKLI {latest} has been downloaded. Restart and update now? (y/n/(s)kip): ").strip().lower()
+    if response.startswith("s"):
+        skip_version(cfg, latest)
+    elif response == "y":
+        restart_with_update(staged_path, latest)
+    return True
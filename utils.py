@@ -1,26 +1,49 @@
-import requests, random, sys, os, json, re, base64, uuid
+import random, sys, os, json, re, base64, time, threading
+import client, screen, keys, metrics, configfile, breaker
 _print = print
-from rich import print
-from rich.progress import Progress, TextColumn, TimeRemainingColumn, TimeElapsedColumn
+from rich import print as rich_print
 from datetime import datetime
-if os.name == "nt":
-    import msvcrt
-else:
-    import tty, termios
-
-if not os.path.exists("config.json"):
-    with open("config.json", "w") as f:
-        json.dump({
-            "accounts": [],
-            "delay": 900,
-            "debug": False
-        }, f, indent=4)
-
-with open("config.json", "r") as f:
-    config: dict = json.load(f)
+from typing import NamedTuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from rich.progress import Progress
+
+config: dict = configfile.load()
+
+# Work running on worker threads (like the saver's account checks) can buffer what it prints per thread and print
+#   it in one piece when it's done, so the output of work running at the same time doesn't interleave.
+#   Everything here prints through `print`, so debug lines from these helpers end up in the same buffer.
+_output = threading.local()
+
+def print(*args, **kwargs):
+    lines = getattr(_output, "lines", None)
+    if lines is None:
+        rich_print(*args, **kwargs)
+    else:
+        lines.append((args, kwargs))
+
+def output_buffer() -> list | None:
+    return getattr(_output, "lines", None)
+
+def set_output_buffer(lines: list | None):
+    # `lines` may be shared with other threads doing part of the same work (list.append is thread-safe)
+    _output.lines = lines
+
+def flush_output(lines: list):
+    for args, kwargs in lines:
+        rich_print(*args, **kwargs)
+
+_local_timezone = None
+
+def local_timezone() -> str:
+    # tzlocal is only imported (and the system timezone looked up) the first time it's needed
+    global _local_timezone
+    if _local_timezone is None:
+        from tzlocal import get_localzone
+        _local_timezone = str(get_localzone())
+    return _local_timezone
 
 def clear():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    screen.clear()
 
 def current_time() -> str:
     return f"[bold bright_black]{datetime.now():%Y-%m-%d %H:%M:%S}[/]"
@@ -34,21 +57,8 @@ def time_taken(t: int | float) -> str:
 def fint(n: int | float) -> str:
     return f"{n:,}" if n != 0 else "inf"
 
-def update_utils_config(new_config: dict):
-    globals()['config'] = new_config
-
 def getch() -> str:
-    if os.name == "nt":
-        ch = msvcrt.getch().decode("utf-8")
-    else:
-        fd = sys.stdin.fileno()
-        old_settings = termios.tcgetattr(fd)
-        try:
-            tty.setraw(fd)
-            ch = sys.stdin.read(1)
-        finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-    return ch
+    return keys.get()
 
 def inp(s: str, ss: list[str] = [], password: bool = False) -> str:
     ss = ", ".join(["Esc to cancel", *ss])
@@ -56,7 +66,10 @@ def inp(s: str, ss: list[str] = [], password: bool = False) -> str:
     print(f"{s} [bright_black][{ss}][/]: ", end="")
     r = []
     while True:
-        c = getch()
+        try:
+            c = getch()
+        except KeyboardInterrupt:
+            c = "\033"
         if c == "\033":
             _print("\033[?25l", end="")
             raise ValueError
@@ -71,7 +84,8 @@ def inp(s: str, ss: list[str] = [], password: bool = False) -> str:
             _print("*" if password else c, end="", flush=True)
             r += c
 
-def farm_progress(type: str, color: str, is_endless: bool = False) -> Progress:
+def farm_progress(type: str, color: str, is_endless: bool = False) -> "Progress":
+    from rich.progress import Progress, TextColumn, TimeRemainingColumn, TimeElapsedColumn
     return Progress(
         TextColumn(" ["+color+"]Farming {task.completed:,}/inf "+type+"...[/]") if is_endless \
             else TextColumn(" ["+color+"]Farming {task.completed:,}/{task.total:,} "+type+"...[/]"),
@@ -83,6 +97,35 @@ def farm_progress(type: str, color: str, is_endless: bool = False) -> Progress:
         "\033[D"
     )
 
+TASK_KEYS_HINT = "Press Ctrl+C or Q to stop, P to pause, S for stats."
+
+def farm_stats(total: int, type: str, start: float) -> list[str]:
+    elapsed = time.monotonic() - start
+    rate = total / elapsed * 60 if elapsed else 0
+    return [f" [blue]{total:,} {type} in {time_taken(elapsed)} ({rate:,.0f} {type}/min)[/]",
+            *(f" [bright_black]{line}[/]" for line in metrics.registry.summary())]
+
+def task_keys(prog: "Progress", stats) -> bool:
+    # Handles keys pressed while a farm is running; returns False once the user asked to stop.
+    # `stats` returns the lines to show for S.
+    while (key := keys.poll()) is not None:
+        key = key.upper()
+        if key == "Q":
+            return False
+        elif key == "S":
+            for line in stats():
+                prog.console.print(line)
+        elif key == "P":
+            prog.console.print(" [yellow]Paused. Press P to resume or Q to stop.[/]")
+            while True:
+                key = keys.get().upper()
+                if key == "Q":
+                    return False
+                if key == "P":
+                    prog.console.print(" [yellow]Resumed.[/]")
+                    break
+    return True
+
 def get_headers(account: int = None, token: str = None, user_id: int = None) -> dict[str, str]:
     if account != None:
         token = config['accounts'][account]['token']
@@ -94,10 +137,19 @@ def get_headers(account: int = None, token: str = None, user_id: int = None) ->
         "content-type": "application/json",
         "cookie": f"jwt_token={token}",
         "origin": "https://www.duolingo.com",
-        "user-agent": randomize_mobile_user_agent(),
+        "user-agent": user_agent(user_id),
         "x-amzn-trace-id": f"User={user_id}",
     }
 
+# One user agent per account for the whole run, so an account looks like a single device on a kept-alive connection
+_user_agents: dict[str, str] = {}
+
+def user_agent(user_id) -> str:
+    key = str(user_id)
+    if key not in _user_agents:
+        _user_agents[key] = randomize_mobile_user_agent()
+    return _user_agents[key]
+
 def randomize_mobile_user_agent() -> str:
     duolingo_version = "6.26.2"
     android_version = random.randint(12, 15)
@@ -154,29 +206,84 @@ def ratelimited_warning():
     except KeyboardInterrupt:
         pass
 
-def get_duo_info(account: int, debug: bool = False) -> dict | None:
-    url = f"https://www.duolingo.com/2017-06-30/users/{config['accounts'][account]['id']}"
+class DuoProfile(NamedTuple):
+    username: str | None = None
+    from_language: str | None = None
+    learning_language: str | None = None
+    streak_data: dict | None = None
+    timezone: str | None = None
+
+# Maps DuoProfile attributes to the field names of the users endpoint.
+PROFILE_FIELDS = {
+    "username": "username",
+    "from_language": "fromLanguage",
+    "learning_language": "learningLanguage",
+    "streak_data": "streakData",
+    "timezone": "timezone",
+}
+
+def profile_url(user_id: int, fields: tuple[str, ...] | list[str]) -> str:
+    return f"https://www.duolingo.com/2017-06-30/users/{user_id}?fields={','.join(PROFILE_FIELDS[f] for f in fields)}"
+
+def parse_profile(data: dict, fields: tuple[str, ...] | list[str]) -> DuoProfile:
+    return DuoProfile(**{f: data.get(PROFILE_FIELDS[f]) for f in fields})
+
+# Per-account profile cache, keyed by user id. Entries expire after `profile_cache_ttl`
+#   seconds (from config.json) and are dropped explicitly after any write that changes the profile.
+# Each entry remembers which fields it holds, so a request for more fields is a miss
+#   and refetches the union of both field sets.
+_profile_cache: dict[int, tuple[float, frozenset[str], DuoProfile]] = {}
+_profile_cache_lock = threading.Lock()
+profile_cache_stats = {"hits": 0, "misses": 0}
+
+def invalidate_duo_info(account: int = None):
+    with _profile_cache_lock:
+        if account is None:
+            _profile_cache.clear()
+        else:
+            _profile_cache.pop(config['accounts'][account]['id'], None)
+
+def get_duo_info(account: int, fields: tuple[str, ...] | list[str], debug: bool = False, max_age: int | float = None) -> DuoProfile | None:
+    user_id = config['accounts'][account]['id']
+    ttl = config.get('profile_cache_ttl', 300) if max_age is None else max_age
+    wanted = frozenset(fields)
+
+    with _profile_cache_lock:
+        cached = _profile_cache.get(user_id)
+        if cached and time.monotonic() - cached[0] < ttl:
+            if wanted <= cached[1]:
+                profile_cache_stats["hits"] += 1
+                if debug:
+                    print(f"{current_time()} [bold magenta][DEBUG][/] Using cached Duolingo info for user {config['accounts'][account]['username']}")
+                return cached[2]
+            wanted |= cached[1]
+        profile_cache_stats["misses"] += 1
+
+    fields = sorted(wanted)
+    url = profile_url(user_id, fields)
     headers = get_headers(account)
 
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
+    status, data, response = client.get_json(url, headers=headers)
+    if status == 200:
         if debug:
             print(f"{current_time()} [bold magenta][DEBUG][/] Retrieved Duolingo info for user {config['accounts'][account]['username']}")
-        return response.json()
+        profile = parse_profile(data, fields)
+        with _profile_cache_lock:
+            _profile_cache[user_id] = (time.monotonic(), wanted, profile)
+        return profile
     elif response.status_code == 403:
         if debug:
             print(f"{current_time()} [bold magenta][DEBUG][/] Rate limited when retrieving Duolingo info for user {config['accounts'][account]['username']}")
 
-        ratelimited_warning()
+        # Only the menus (on the main thread) can wait for a key; worker threads (snapshot reads, saver checks)
+        #   just get None and let their caller report it
+        if threading.current_thread() is threading.main_thread():
+            ratelimited_warning()
 
         return None
     else:
         if debug:
-            print(
-                f"{current_time()} [bold magenta][DEBUG][/] Failed to retrieve Duolingo info for user {config['accounts'][account]['username']}\n"
-                f"{current_time()} [bold magenta][DEBUG][/] Status code {response.status_code}\n"
-                f"{current_time()} [bold magenta][DEBUG][/] Content: {response.text}"
-            )
+            print(f"{current_time()} [bold magenta][DEBUG][/] Failed to retrieve Duolingo info for user {config['accounts'][account]['username']}")
         return None
 
 def fetch_username_and_id(token: str, debug: bool = False) -> dict[str, int | str, str] | str:
@@ -192,8 +299,11 @@ def fetch_username_and_id(token: str, debug: bool = False) -> dict[str, int | st
     user_id = payload.get('sub')
 
     headers = get_headers(token=token, user_id=user_id)
-    url = f"https://www.duolingo.com/2017-06-30/users/{user_id}"
-    response = requests.get(url, headers=headers)
+    url = profile_url(user_id, ("username",))
+    try:
+        response = client.get(url, headers=headers)
+    except breaker.CircuitOpen as e:
+        return f" [bold red]Duolingo is rate limiting this account. Please try again in {e.retry_in:.0f} seconds.[/]"
     if response.status_code != 200:
         s = " [bold red]Failed to retrieve Duolingo profile. Please check your privacy settings or try again later.[/]"
         if debug:
@@ -203,11 +313,12 @@ def fetch_username_and_id(token: str, debug: bool = False) -> dict[str, int | st
             )
         return s
 
-    username = response.json().get("username", "Unknown")
+    username = parse_profile(response.json(), ("username",)).username or "Unknown"
 
     return {"username": username, "id": user_id}
 
 def login_password(identifier: str, password: str, debug: bool = False) -> dict[str, int | str, str] | str | None:
+    from uuid import uuid4
     url = "https://ios-api-cf.duolingo.com/2023-05-23/login"
     headers = {
         "accept": "application/json",
@@ -220,11 +331,14 @@ def login_password(identifier: str, password: str, debug: bool = False) -> dict[
     data = {
         "identifier": identifier,
         "password": password,
-        "distinctId": str(uuid.uuid4()).upper(),
+        "distinctId": str(uuid4()).upper(),
         "fields": "id,username"
     }
 
-    response = requests.post(url, headers=headers, json=data)
+    try:
+        response = client.post(url, headers=headers, json=data)
+    except breaker.CircuitOpen as e:
+        return f" [bold red]Duolingo is rate limiting logins. Please try again in {e.retry_in:.0f} seconds.[/]"
 
     if response.status_code != 200:
         s = " [bold red]Failed to log in to your Duolingo account. Make sure you're using the correct credentials and that you can log in using a password.[/]"
@@ -235,12 +349,13 @@ def login_password(identifier: str, password: str, debug: bool = False) -> dict[
             )
         return s
 
+    from requests.cookies import CookieConflictError
     data = response.json()
     username = data.get("username", "Unknown")
     user_id = data.get("id")
     try:
         jwt_token = response.cookies.get('jwt_token')
-    except requests.cookies.CookieConflictError:
+    except CookieConflictError:
         jwt_token = response.headers.get('jwt')
 
     if jwt_token:
@@ -263,16 +378,15 @@ class Menu:
         menu_list = [self.title(), *menu_list]
         opt_types = ["header", *[type(x) for x in lines]]
 
-        clear()
-        for s in menu_list:
-            print(s)
+        screen.render(menu_list)
 
         opt = ""
         while opt not in keys:
             opt = getch().upper()
 
-        clear()
-        for s, opt_type in zip(menu_list, opt_types):
-            print(s if opt_type == "header" else f"[bold]{s}[/]" if f"{opt}. " in s else re.sub(r"\[.*?\]", "[bright_black]", s, count=1))
+        screen.render([
+            s if opt_type == "header" else f"[bold]{s}[/]" if f"{opt}. " in s else re.sub(r"\[.*?\]", "[bright_black]", s, count=1)
+            for s, opt_type in zip(menu_list, opt_types)
+        ])
 
         return opt